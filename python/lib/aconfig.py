@@ -4,20 +4,45 @@
 # config.py - python bindings for the ALSA's configuration using ctype
 # Copyright (c) 2020 Jaroslav Kysela <perex@perex.cz>
 
+import os
+import re
+import sys
+import mmap
+import marshal
+import fnmatch
+from functools import lru_cache
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
 from ctypes import *
 from errno import errorcode, ENOENT
+from weakref import WeakSet, WeakValueDictionary
+from cachestore import CacheStore
 
-alsalib = CDLL('libasound.so')
+# libasound is loaded on the first call of a bound C function
+alsalib = None
 
 class Test(Structure):
     pass
 
+def libasound():
+    """Return the libasound library (load it when not loaded yet)"""
+    global alsalib
+    if alsalib is None:
+        alsalib = CDLL('libasound.so')
+    return alsalib
+
 def deff(name, argtypes, restype):
-    """define C function"""
+    """define C function (the symbol is resolved on the first call)"""
     g = globals()
-    g[name] = f = alsalib[name]
-    f.argtypes = argtypes
-    f.restype = restype
+
+    def bind(*args):
+        g[name] = f = libasound()[name]
+        f.argtypes = argtypes
+        f.restype = restype
+        return f(*args)
+
+    bind.__name__ = name
+    g[name] = bind
 
 deff('snd_input_stdio_open', [c_void_p, c_char_p, c_char_p], c_int)
 deff('snd_input_buffer_open', [c_void_p, c_char_p, c_ssize_t], c_int)
@@ -28,6 +53,7 @@ deff('snd_output_buffer_string', [c_void_p, c_void_p], c_size_t)
 deff('snd_output_close', [c_void_p], c_int)
 deff('snd_config_top', [c_void_p], c_int)
 deff('snd_config_load', [c_void_p, c_void_p], c_int)
+deff('snd_config_load_override', [c_void_p, c_void_p], c_int)
 deff('snd_config_save', [c_void_p, c_void_p], c_int)
 deff('snd_config_delete', [c_void_p], c_int)
 deff('snd_config_remove', [c_void_p], c_int)
@@ -47,6 +73,11 @@ deff('snd_config_get_integer64', [c_void_p, c_void_p], c_int)
 deff('snd_config_get_real', [c_void_p, c_void_p], c_int)
 deff('snd_config_get_string', [c_void_p, c_void_p], c_int)
 deff('snd_config_set_id', [c_void_p, c_char_p], c_int)
+deff('snd_config_set_integer', [c_void_p, c_long], c_int)
+deff('snd_config_set_integer64', [c_void_p, c_longlong], c_int)
+deff('snd_config_set_real', [c_void_p, c_double], c_int)
+deff('snd_config_set_string', [c_void_p, c_char_p], c_int)
+deff('snd_config_make_compound', [c_void_p, c_char_p, c_int], c_int)
 
 SND_CONFIG_TYPE_INTEGER = 0
 SND_CONFIG_TYPE_INTEGER64 = 1
@@ -55,6 +86,8 @@ SND_CONFIG_TYPE_STRING = 3
 SND_CONFIG_TYPE_POINTER = 4
 SND_CONFIG_TYPE_COMPOUND = 1024
 
+INT_MAX = 2147483647
+
 ALSACONFIG_TYPES = {
     SND_CONFIG_TYPE_INTEGER: 'integer',
     SND_CONFIG_TYPE_INTEGER64: 'integer64',
@@ -64,12 +97,100 @@ ALSACONFIG_TYPES = {
     SND_CONFIG_TYPE_COMPOUND: 'compound'
 }
 
+# shared type code objects (the ints returned from C are not cached)
+ALSACONFIG_TYPE_CODES = dict((t, t) for t in ALSACONFIG_TYPES)
+
+# configuration parsers for AlsaConfigTree (ACONFIG_BACKEND environment)
+CONFIG_BACKENDS = ('alsalib', 'python')
+
 class AlsaConfigError(Exception):
     """Indicates exceptions raised by a AlsaConfig class."""
     pass
 
+def config_get_value(config, type):
+    """Return the value of the C configuration node (not compound)"""
+    if type == SND_CONFIG_TYPE_INTEGER:
+        val = c_long()
+        if snd_config_get_integer(config, byref(val)):
+            raise AlsaConfigError("unable to get integer")
+        return val.value
+    if type == SND_CONFIG_TYPE_INTEGER64:
+        val = c_int64()
+        if snd_config_get_integer64(config, byref(val)):
+            raise AlsaConfigError("unable to get integer64")
+        return val.value
+    if type == SND_CONFIG_TYPE_REAL:
+        val = c_double()
+        if snd_config_get_real(config, byref(val)):
+            raise AlsaConfigError("unable to get real")
+        return val.value
+    if type == SND_CONFIG_TYPE_STRING:
+        val = c_char_p()
+        if snd_config_get_string(config, byref(val)):
+            raise AlsaConfigError("unable to get string")
+        return sys.intern(val.value.decode('utf-8'))
+    if type == SND_CONFIG_TYPE_POINTER:
+        raise AlsaConfigError("cannot handle pointer type")
+
+CONFIG_QUOTE_CHARS = ' =;,.{}[]\'"*#<>\\'
+# the new line is written as is, alsa-lib skips the escaped new line
+# (including \n and \012) when the string is parsed
+CONFIG_ESCAPES = {'\n': '\n', '\t': '\\t', '\v': '\\v', '\b': '\\b',
+                  '\r': '\\r', '\f': '\\f', '\\': '\\\\'}
+
+def config_quote(s, id=False):
+    """Return the string in the ALSA configuration syntax"""
+    if not s:
+        return "''"
+    # numbers for values, merge mode prefixes for identifiers
+    quote = s[0] in (id and '+-?!' or '0123456789-')
+    if not quote:
+        for c in s:
+            if c in CONFIG_QUOTE_CHARS or c <= '\x1f' or c == '\x7f':
+                quote = True
+                break
+    if not quote:
+        return s
+    q = s.find("'") >= 0 and '"' or "'"
+    r = [q]
+    for c in s:
+        if c in CONFIG_ESCAPES:
+            r.append(CONFIG_ESCAPES[c])
+        elif c == q:
+            r.append('\\' + c)
+        elif c <= '\x1f' or c == '\x7f':
+            r.append('\\%03o' % ord(c))
+        else:
+            r.append(c)
+    r.append(q)
+    return ''.join(r)
+
+def config_format(type, val):
+    """Return the leaf value in the ALSA configuration syntax"""
+    if type in (SND_CONFIG_TYPE_INTEGER, SND_CONFIG_TYPE_INTEGER64):
+        return str(val)
+    if type == SND_CONFIG_TYPE_REAL:
+        if val != val:
+            return '-nan'
+        if val == float('inf'):
+            raise AlsaConfigError("positive infinity cannot be saved")
+        return repr(val)
+    if type == SND_CONFIG_TYPE_STRING:
+        return config_quote(val)
+    raise AlsaConfigError("cannot save type %s" % ALSACONFIG_TYPES.get(type, type))
+
+def config_backend(backend=None):
+    """Return the configuration parser backend name"""
+    if backend is None:
+        backend = os.environ.get('ACONFIG_BACKEND', 'alsalib')
+    if not backend in CONFIG_BACKENDS:
+        raise AlsaConfigError("unknown configuration backend '%s'" % backend)
+    return backend
+
 class AlsaConfigBase:
 
+    __slots__ = ()
+
     def type_compare(self, node):
         return self.type == node.type
 
@@ -91,17 +212,28 @@ class AlsaConfigBase:
     def is_compound(self):
         return self.type == SND_CONFIG_TYPE_COMPOUND
         
+    def get_shape(self):
+        """Return the (is_array, keys) tuple of the compound node.
+
+        The result is cached in the node until the children are modified,
+        the keys list must not be modified by the caller."""
+        shape = self.shape
+        if shape is None:
+            keys = [node.id for node in self]
+            a = True
+            x = 0
+            for id in keys:
+                if id != str(x):
+                    a = False
+                    break
+                x += 1
+            self.shape = shape = (a, keys)
+        return shape
+
     def is_array(self):
         if self.type != SND_CONFIG_TYPE_COMPOUND:
             return False
-        x = 0
-        a = True
-        for node in self:
-            if node.id != str(x):
-               a = False
-               break
-            x += 1
-        return a
+        return self.get_shape()[0]
 
     def is_empty(self):
         return len(self) == 0
@@ -109,10 +241,19 @@ class AlsaConfigBase:
     def keys(self):
         if self.type != SND_CONFIG_TYPE_COMPOUND:
             return False
-        r = []
-        for n in self:
-            r.append(n.id)
-        return r
+        return self.get_shape()[1]
+
+    def view(self):
+        """Return a read-only lazy view of the node.
+
+        The compound nodes are wrapped to AlsaConfigSequence (arrays) or
+        to AlsaConfigMapping, the leaves are converted on access. Other
+        nodes return value()."""
+        if self.type != SND_CONFIG_TYPE_COMPOUND:
+            return self.value()
+        if self.is_array():
+            return AlsaConfigSequence(self)
+        return AlsaConfigMapping(self)
 
     def full_id(self):
         id = repr(self.id)
@@ -123,123 +264,597 @@ class AlsaConfigBase:
             parent = parent.parent
         return id
 
+    def walk_with_path(self, post=False, prune=None):
+        """Generate (path, node) tuples of the subtree without recursion.
+
+        The path is the tuple of identifiers relative to this node, which
+        is generated first (post=False, pre-order) or last (post=True,
+        post-order). When prune(node) returns True, the children of this
+        compound are skipped. The tree may be modified during the walk
+        (see AlsaConfigTreeIterator)."""
+        if self.type != SND_CONFIG_TYPE_COMPOUND or \
+           (not prune is None and prune(self)):
+            yield (), self
+            return
+        if not post:
+            yield (), self
+        stack = [((), self, iter(self))]
+        while stack:
+            path, parent, it = stack[-1]
+            for node in it:
+                npath = path + (node.id,)
+                if not post:
+                    yield npath, node
+                if node.type == SND_CONFIG_TYPE_COMPOUND and \
+                   (prune is None or not prune(node)):
+                    stack.append((npath, node, iter(node)))
+                    break
+                if post:
+                    yield npath, node
+            else:
+                stack.pop()
+                if post:
+                    yield path, parent
+
+    def walk(self, post=False, prune=None):
+        """Generate the nodes of the subtree without recursion (see walk_with_path())"""
+        if post:
+            for path, node in self.walk_with_path(True, prune):
+                yield node
+            return
+        yield self
+        if self.type != SND_CONFIG_TYPE_COMPOUND or \
+           (not prune is None and prune(self)):
+            return
+        stack = [iter(self)]
+        while stack:
+            for node in stack[-1]:
+                yield node
+                if node.type == SND_CONFIG_TYPE_COMPOUND and \
+                   (prune is None or not prune(node)):
+                    stack.append(iter(node))
+                    break
+            else:
+                stack.pop()
+
+    def leaves(self, prune=None):
+        """Generate the leaf (not compound) nodes of the subtree"""
+        for node in self.walk(prune=prune):
+            if node.type != SND_CONFIG_TYPE_COMPOUND:
+                yield node
+
+    def iterdump(self, alsa=False):
+        """Generate the configuration text line by line.
+
+        The default is the 'full_id value' format used by dumps(). When alsa
+        is True, the ALSA configuration syntax is used (loadable by
+        AlsaConfig.loads())."""
+        if self.type != SND_CONFIG_TYPE_COMPOUND:
+            if alsa:
+                yield '%s %s\n' % (config_quote(self.id, True), config_format(self.type, self.value()))
+            else:
+                yield '%s %s\n' % (self.full_id(), repr(self.value()))
+            return
+        if alsa:
+            # (closing bracket, array) of the open compounds
+            opened = []
+            for path, n in self.walk_with_path():
+                depth = len(path)
+                if depth == 0:
+                    continue
+                while len(opened) >= depth:
+                    yield '%s%s\n' % ('\t' * (len(opened) - 1), opened.pop()[0])
+                indent = '\t' * (depth - 1)
+                id = not (opened and opened[-1][1]) and config_quote(n.id, True) + ' ' or ''
+                if n.type == SND_CONFIG_TYPE_COMPOUND:
+                    if n.is_array():
+                        yield '%s%s[\n' % (indent, id)
+                        opened.append((']', True))
+                    else:
+                        yield '%s%s{\n' % (indent, id)
+                        opened.append(('}', False))
+                else:
+                    yield '%s%s%s\n' % (indent, id, config_format(n.type, n.value()))
+            while opened:
+                yield '%s%s\n' % ('\t' * (len(opened) - 1), opened.pop()[0])
+            return
+        prefix = ''
+        parent = self
+        while not parent is None:
+            if parent.id:
+                prefix = repr(parent.id) + '.' + prefix
+            parent = parent.parent
+        prefixes = [prefix]
+        for path, n in self.walk_with_path():
+            depth = len(path)
+            if depth == 0:
+                continue
+            del prefixes[depth:]
+            prefix = prefixes[-1]
+            if n.type == SND_CONFIG_TYPE_COMPOUND:
+                prefixes.append(n.id and prefix + repr(n.id) + '.' or prefix)
+            else:
+                yield '%s%s %s\n' % (prefix, repr(n.id), repr(n.value()))
+
+    def write(self, fp, alsa=False):
+        """Write the configuration to a file-like object (see iterdump())"""
+        for line in self.iterdump(alsa):
+            fp.write(line)
+
     def typename(self):
         if self.type in ALSACONFIG_TYPES:
             return ALSACONFIG_TYPES[self.type]
         return "type<%s>" % self.type
 
+    def get(self, key, default=None):
+        """Return the child node or default"""
+        if key in self:
+            return self[key]
+        return default
+
+    def get_literal(self, id, default=None):
+        """Return the child node with the literal id or default.
+
+        The dots are not path separators here, even for AlsaConfig
+        where get() and [] follow snd_config_search()."""
+        return self.get(id, default)
+
+    def items(self):
+        """Return the list of (id, node) tuples of the compound"""
+        return [(node.id, node) for node in self]
+
     def split_id(self, id):
+        """Split the dot separated id to the list of identifiers"""
+        return [v for kind, v in config_query(id, False).segments]
+
+    def search(self, id):
+        """Search (complex / dot separated) id in the tree, no wildcards"""
+        return config_query(id, False).first(self)
+
+    def query(self, path):
+        """Return the list of all nodes matching the path (see AlsaConfigQuery)"""
+        return config_query(path).match(self)
+
+QUERY_LITERAL = 0
+QUERY_ANY = 1
+QUERY_PATTERN = 2
+
+class AlsaConfigQuery:
+    """Compiled path query.
+
+    The path is the dot separated list of identifiers. The quoted segments
+    ('a.b' or "a.b") are used literally. The unquoted segments may use
+    the shell-like wildcards (*, ? and [...]). Example:
+
+      SectionDevice.*.Value.PlaybackPCM
+
+    The literal segments are looked up using the child index of the nodes
+    (get_literal()). When wildcards is False, all segments are literal."""
+
+    def __init__(self, path, wildcards=True):
+        self.path = path
+        self.wildcards = wildcards
+        self.segments = tuple(self.split(path))
+        self.literal = True
+        self.compiled = []
+        for kind, v in self.segments:
+            if kind == QUERY_PATTERN:
+                v = re.compile(fnmatch.translate(v)).match
+            if kind != QUERY_LITERAL:
+                self.literal = False
+            self.compiled.append((kind, v))
+
+    def __repr__(self):
+        return 'AlsaConfigQuery(%s)' % repr(self.path)
+
+    def error(self):
+        raise AlsaConfigError("wrong id %s" % repr(self.path))
+
+    def split(self, path):
         r = []
-        id1 = id
-        while id1:
-            if id1[0] in ('"', "'"):
-                d = id1[0]
-                id = id1[1:]
-                p = id1.find(id1, d)
-                if p < 0:
-                    raise AlsaConfigError("wrong id %s" % repr(id))
-                r.append(id1[:p])
-                id1 = id1[1:]
-                if id1 and not id1['.']:
-                    raise AlsaConfigError("wrong id %s" % repr(id))
-                id1 = id1[1:]
+        pos = 0
+        l = len(path)
+        while pos < l:
+            q = path[pos]
+            if q in ('"', "'"):
+                pos += 1
+                v = []
+                while pos < l and path[pos] != q:
+                    if path[pos] == '\\' and pos + 1 < l:
+                        pos += 1
+                    v.append(path[pos])
+                    pos += 1
+                if pos >= l:
+                    self.error()
+                pos += 1
+                r.append((QUERY_LITERAL, ''.join(v)))
             else:
-                r.append(id1)
-                break
+                end = path.find('.', pos)
+                if end < 0:
+                    end = l
+                v = path[pos:end]
+                if not v:
+                    self.error()
+                if not self.wildcards:
+                    r.append((QUERY_LITERAL, v))
+                elif v == '*':
+                    r.append((QUERY_ANY, v))
+                elif '*' in v or '?' in v or '[' in v:
+                    r.append((QUERY_PATTERN, v))
+                else:
+                    r.append((QUERY_LITERAL, v))
+                pos = end
+            if pos < l:
+                if path[pos] != '.' or pos + 1 >= l:
+                    self.error()
+                pos += 1
         return r
 
-    def search(self, id):
-        """Search (complex / dot separated) id in the tree"""
-        a = self.split_id(id)
-        parent = self
-        for k in a:
-            if not k in parent:
-                return None
-            parent = parent[k]
-        return parent
+    def first(self, node):
+        """Return the first matching node or None"""
+        if self.literal:
+            for kind, v in self.compiled:
+                if not node.is_compound():
+                    return None
+                node = node.get_literal(v)
+                if node is None:
+                    return None
+            return node
+        r = self.match(node)
+        return r and r[0] or None
+
+    def match(self, node):
+        """Return the list of the matching nodes"""
+        nodes = [node]
+        for kind, v in self.compiled:
+            r = []
+            for n in nodes:
+                if not n.is_compound():
+                    continue
+                if kind == QUERY_LITERAL:
+                    n = n.get_literal(v)
+                    if not n is None:
+                        r.append(n)
+                elif kind == QUERY_ANY:
+                    r.extend(n)
+                else:
+                    for n2 in n:
+                        if v(n2.id):
+                            r.append(n2)
+            nodes = r
+            if not nodes:
+                break
+        return nodes
+
+@lru_cache(maxsize=1024)
+def config_query(path, wildcards=True):
+    """Return the compiled (cached) AlsaConfigQuery for the path"""
+    return AlsaConfigQuery(path, wildcards)
+
+class AlsaConfigMapping(Mapping):
+    """Read-only dictionary view of a compound node (see view())"""
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        if type(key) != type(''):
+            raise KeyError(key)
+        try:
+            return self.node[key].view()
+        except AlsaConfigError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return type(key) == type('') and key in self.node
+
+    def __iter__(self):
+        return iter(self.node.keys())
+
+    def __len__(self):
+        return len(self.node)
+
+    def __repr__(self):
+        return repr(self.node.value())
+
+class AlsaConfigSequence(Sequence):
+    """Read-only list view of an array compound node (see view())"""
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        l = len(self.node)
+        if idx < 0:
+            idx += l
+        if idx < 0 or idx >= l:
+            raise IndexError("array index out of range")
+        return self.node[str(idx)].view()
+
+    def __len__(self):
+        return len(self.node)
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.node.value())
 
 class AlsaConfigIterator:
+    """Iterator over the children of a C compound node.
+
+    The tree may be modified through the wrappers while iterating. The
+    next node is read from the live list on each step. The iterator is
+    registered in the cursors of the compound wrapper and remove() calls
+    moving() before the child is unlinked, so when the current node is
+    removed, the iterator of the following node is fetched while it is
+    still valid (no pointer to a freed node is kept)."""
 
     def __init__(self, node):
         self.node = node
-        self.next = None
+        self.end = snd_config_iterator_end(node.config)
+        self.pos = None
+        self.pending = snd_config_iterator_first(node.config)
+        if node.cursors is None:
+            node.cursors = WeakSet()
+        node.cursors.add(self)
+
+    def __iter__(self):
+        return self
+
+    def moving(self, node):
+        """The child node will be unlinked from the compound"""
+        p = node.config.value
+        if self.pending is None:
+            if snd_config_iterator_entry(self.pos) == p:
+                self.pending = snd_config_iterator_next(self.pos)
+        elif self.pending != self.end and snd_config_iterator_entry(self.pending) == p:
+            self.pending = snd_config_iterator_next(self.pending)
 
     def __next__(self):
-        if self.next is None:
-            n = snd_config_iterator_first(self.node.config)
+        n = self.pending
+        if n is None:
+            n = snd_config_iterator_next(self.pos)
         else:
-            n = self.next
-        if n == snd_config_iterator_end(self.node.config):
+            self.pending = None
+        if n == self.end:
+            self.pending = n
+            cursors = self.node.cursors
+            if not cursors is None:
+                cursors.discard(self)
+                if not cursors:
+                    self.node.cursors = None
             raise StopIteration
-        n = c_void_p(n)
-        e = snd_config_iterator_entry(n)
-        self.next = snd_config_iterator_next(n)
-        return AlsaConfig(self.node).loadp(c_void_p(e))
+        self.pos = n
+        return self.node.child(snd_config_iterator_entry(n))
 
 class AlsaConfig(AlsaConfigBase):
+    """The configuration tree in the alsa-lib (ctypes).
+
+    The wrappers of the child nodes are cached (weakly, keyed by the C
+    pointer) in the root wrapper, so one C node has one wrapper while it
+    is referenced.
+
+    The top-level wrapper owns the C tree. It is freed by close(), at the
+    end of the with statement or when the wrapper is deleted. The child
+    wrappers must not be used after that."""
 
     def __init__(self, parent=None):
         self.parent = parent
+        self.root = None
+        if not parent is None:
+            self.root = parent.root
+            if self.root is None:
+                self.root = parent
+        self.wrappers = None
+        self.cursors = None
         self.config = c_void_p()
         self.id = None
         self.type = None
         self.top = False
+        self.shape = None
 
     def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Free the C tree owned by this (top-level) wrapper.
+
+        The cached wrappers of the nodes still in this tree are cleared.
+        The nodes detached by remove() or moved to another tree are owned
+        by another top-level wrapper, so they are moved to its cache."""
+        if self.wrappers:
+            for p, c in list(self.wrappers.items()):
+                owner = c
+                while not owner.top and not owner.parent is None:
+                    owner = owner.parent
+                if owner is self:
+                    c.config = c_void_p()
+                    c.type = None
+                    c.shape = None
+                elif owner.top and owner.config:
+                    if owner is c:
+                        c.root = None
+                        continue
+                    c.root = owner
+                    if owner.wrappers is None:
+                        owner.wrappers = WeakValueDictionary()
+                    owner.wrappers[p] = c
+        self.wrappers = None
         if self.top and self.config:
             snd_config_delete(self.config)
+            self.config = c_void_p()
+            self.type = None
+            self.shape = None
+        self.top = False
 
     def __iter__(self):
         if self.type == SND_CONFIG_TYPE_COMPOUND:
             return AlsaConfigIterator(self)
         raise AlsaConfigError("only compound nodes are iterable")
 
+    def child(self, config):
+        """Return the wrapper for the C pointer of a child node"""
+        root = self.root
+        if root is None:
+            root = self
+        cache = root.wrappers
+        if cache is None:
+            cache = root.wrappers = WeakValueDictionary()
+        c = cache.get(config)
+        if c is None:
+            c = self.__class__(self)
+            c.loadp(c_void_p(config))
+            cache[config] = c
+        return c
+
+    def _adopt(self, node):
+        """Move the wrappers of the added subtree to the cache of this tree.
+
+        Return the previous owner (root) of the wrappers or None when
+        the node was already in this tree."""
+        root = self.root
+        if root is None:
+            root = self
+        old = node.root
+        if old is None:
+            old = node
+        if old is root:
+            return None
+        if root.wrappers is None:
+            root.wrappers = WeakValueDictionary()
+        wrappers = old.wrappers
+        if wrappers:
+            wrappers.pop(node.config.value, None)
+        node.root = root
+        root.wrappers[node.config.value] = node
+        self._moved(old, node)
+        if not wrappers or node.type != SND_CONFIG_TYPE_COMPOUND:
+            return old
+        # look up only the C nodes of the moved subtree
+        stack = [node.config.value]
+        while stack:
+            config = stack.pop()
+            i = snd_config_iterator_first(config)
+            end = snd_config_iterator_end(config)
+            while i != end:
+                p = snd_config_iterator_entry(i)
+                c = wrappers.pop(p, None)
+                if not c is None:
+                    c.root = root
+                    root.wrappers[p] = c
+                    self._moved(old, c)
+                if snd_config_get_type(p) == SND_CONFIG_TYPE_COMPOUND:
+                    stack.append(p)
+                i = snd_config_iterator_next(i)
+        return old
+
+    def _moved(self, old, c):
+        """Called for the wrappers moved from the tree old by _adopt()"""
+        pass
+
+    def lookup(self, id):
+        """Return the C pointer of the node or None (snd_config_search(),
+        the dotted ids are paths)"""
+        p = c_void_p()
+        if snd_config_search(self.config, id.encode('utf-8'), byref(p)):
+            return None
+        return p.value
+
+    def find(self, key):
+        """Return the wrapper of the node or None (the dotted keys are paths)
+
+        The path is resolved level by level, so the wrappers get the
+        right parent."""
+        node = self
+        for id in key.split('.'):
+            if not node.is_compound():
+                return None
+            p = node.lookup(id)
+            if p is None:
+                return None
+            node = node.child(p)
+        return node
+
     def __contains__(self, node):
-        id = node
         if type(node) != type(''):
-            id = node.id
-        p = c_void_p()
-        r = snd_config_search(self.config, id.encode('utf-8'), byref(p))
-        return r == 0
+            # the node identifier is literal, not a path
+            return not self.get_literal(node.id) is None
+        return not self.lookup(node) is None
 
     def __getitem__(self, key):
         if self.type == SND_CONFIG_TYPE_COMPOUND:
-            p = c_void_p()
-            r = snd_config_search(self.config, key.encode('utf-8'), byref(p))
-            if r < 0:
+            n = self.find(key)
+            if n is None:
                 raise AlsaConfigError("compound id '%s' not found" % key)
-            c = AlsaConfig(self)
-            c.loadp(p)
-            return c
+            return n
         raise AlsaConfigError("only compound nodes implements __getitem__")
 
+    def get(self, key, default=None):
+        """Return the node or default (the dotted keys are paths)"""
+        if self.type != SND_CONFIG_TYPE_COMPOUND:
+            raise AlsaConfigError("only compound nodes implement get")
+        n = self.find(key)
+        if n is None:
+            return default
+        return n
+
+    def get_literal(self, id, default=None):
+        """Return the child node with the literal id or default"""
+        if id.find('.') < 0:
+            return self.get(id, default)
+        for n in self:
+            if n.id == id:
+                return n
+        return default
+
     def __len__(self):
         if not self.is_compound():
             raise AlsaConfigError("node %s is not a compound" % self.full_id())
-        r = 0
-        n = snd_config_iterator_first(self.config)
-        while n != snd_config_iterator_end(self.config):
-            n = snd_config_iterator_next(n)
-            r += 1
-        return r
+        return len(self.get_shape()[1])
 
     def set_id(self, id):
         """Set new id string"""
+        if not self.config:
+            # the node is created later (make_compound)
+            self.id = str(id)
+            return
         if snd_config_set_id(self.config, str(id).encode('utf-8')):
             raise AlsaConfigError("unable to set new id")
         self.id = str(id)
+        if not self.parent is None:
+            self.parent.shape = None
 
-    def _load(self, input):
+    def _load(self, input, override=False):
+        self.close()
         config = c_void_p()
         if snd_config_top(byref(config)):
             snd_input_close(input)
             raise AlsaConfigError("unable to create top config")
-        self.top = True
         self.loadp(config)
+        self.top = True
         self.type = SND_CONFIG_TYPE_COMPOUND
-        if snd_config_load(config, input):
-            raise AlsaConfigError("unable to load config")
+        if override:
+            r = snd_config_load_override(config, input)
+        else:
+            r = snd_config_load(config, input)
         snd_input_close(input)
+        if r:
+            raise AlsaConfigError("unable to load config")
 
     def load(self, filename):
         """Load configuration from a file"""
@@ -249,12 +864,12 @@ class AlsaConfig(AlsaConfigBase):
         return self._load(input)
 
     def loadp(self, config):
-        """Load configuration node from C pointer"""
-        if self.config:
-            snd_config_delete(self.config)
+        """Load configuration node from C pointer (not owned by this wrapper)"""
+        self.close()
         self.config = config
         self.type = snd_config_get_type(config)
         self.id = None
+        self.shape = None
         id = c_char_p()
         if snd_config_get_id(config, byref(id)):
             raise AlsaConfigError("unable to get config id")
@@ -262,26 +877,97 @@ class AlsaConfig(AlsaConfigBase):
             self.id = id.value.decode('utf-8')
         return self
 
-    def loads(self, text):
-        """Load configuration from a string"""
+    def loads(self, text, override=False):
+        """Load configuration from a string or a bytes-like object.
+
+        The bytes, bytearray, memoryview and mmap objects are passed to
+        snd_input_buffer_open() without a copy (the read-only buffers
+        except bytes are copied). The override mode is the default mode
+        of the definitions when set (snd_config_load_override())."""
         input = c_void_p()
-        buf = text.encode('utf-8');
-        if snd_input_buffer_open(byref(input), buf, len(buf)):
+        if isinstance(text, str):
+            text = text.encode('utf-8')
+        if isinstance(text, bytes):
+            r = snd_input_buffer_open(byref(input), text, len(text))
+        else:
+            with memoryview(text) as m:
+                if not m.c_contiguous:
+                    raise AlsaConfigError("the buffer must be contiguous")
+                if m.readonly:
+                    r = snd_input_buffer_open(byref(input), m.tobytes(), m.nbytes)
+                else:
+                    with m.cast('B') as m2:
+                        buf = (c_char * m2.nbytes).from_buffer(m2)
+                        r = snd_input_buffer_open(byref(input), buf, m2.nbytes)
+                        del buf
+        if r:
             raise AlsaConfigError("unable to open text buffer")
-        return self._load(input)
+        return self._load(input, override)
+
+    def load_mmap(self, filename):
+        """Load configuration from a file using mmap"""
+        with open(filename, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                return self.loads(b'')
+            # ACCESS_COPY gives a writable (private) mapping for loads()
+            m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_COPY)
+        try:
+            return self.loads(m)
+        finally:
+            m.close()
 
     def copy(self):
         """Create a new duplicate value"""
-        c = AlsaConfig()
-        if snd_config_copy(byref(c.config), self.config):
+        config = c_void_p()
+        if snd_config_copy(byref(config), self.config):
             raise AlsaConfigError("unable to copy configuration node")
+        c = AlsaConfig().loadp(config)
+        c.top = True
         return c
 
     def remove(self):
-        """Remove this node from the parent"""
+        """Remove this node from the parent (the wrapper owns it then)"""
+        if not self.parent is None and self.parent.cursors:
+            for c in self.parent.cursors:
+                c.moving(self)
         if snd_config_remove(self.config):
             raise AlsaConfigError("unable to remove node")
+        if not self.parent is None:
+            self.parent.shape = None
         self.parent = None
+        self.top = True
+
+    def make_compound(self):
+        """Create a new (empty) compound for a wrapper without the C node.
+
+        The C node type cannot be changed, so only the detached nodes
+        owned by the wrapper are replaced."""
+        if self.config and not self.top:
+            raise AlsaConfigError("node %s is in a tree" % self.full_id())
+        self.close()
+        config = c_void_p()
+        id = None
+        if not self.id is None:
+            id = self.id.encode('utf-8')
+        if snd_config_make_compound(byref(config), id, 0):
+            raise AlsaConfigError("unable to create compound")
+        self.loadp(config)
+        self.top = True
+
+    def set_value(self, val):
+        """Set new value of the leaf node"""
+        if self.type == SND_CONFIG_TYPE_INTEGER:
+            r = snd_config_set_integer(self.config, val)
+        elif self.type == SND_CONFIG_TYPE_INTEGER64:
+            r = snd_config_set_integer64(self.config, val)
+        elif self.type == SND_CONFIG_TYPE_REAL:
+            r = snd_config_set_real(self.config, val)
+        elif self.type == SND_CONFIG_TYPE_STRING:
+            r = snd_config_set_string(self.config, val.encode('utf-8'))
+        else:
+            raise AlsaConfigError("node %s is not a leaf" % self.full_id())
+        if r:
+            raise AlsaConfigError("unable to set value for %s" % self.full_id())
 
     def dumps(self):
         """Save (dump) configuration to a string"""
@@ -299,28 +985,7 @@ class AlsaConfig(AlsaConfigBase):
 
     def value(self):
         if not self.is_compound():
-            if self.is_integer():
-                val = c_int()
-                if snd_config_get_integer(self.config, byref(val)):
-                    raise AlsaConfigError("unable to get integer")
-                return val.value
-            if self.is_integer64():
-                val = c_int64()
-                if snd_config_get_integer(self.config, byref(val)):
-                    raise AlsaConfigError("unable to get integer64")
-                return val.value
-            if self.is_real():
-                val = c_double()
-                if snd_config_get_integer(self.config, byref(val)):
-                    raise AlsaConfigError("unable to get real")
-                return val.value
-            if self.is_string():
-                val = c_char_p()
-                if snd_config_get_string(self.config, byref(val)):
-                    raise AlsaConfigError("unable to get string")
-                return val.value.decode('utf-8')
-            if self.is_pointer():
-                raise AlsaConfigError("cannot handle pointer type")
+            return config_get_value(self.config, self.type)
         else:
             if self.is_array():
                 d = []
@@ -336,50 +1001,108 @@ class AlsaConfig(AlsaConfigBase):
         r = snd_config_add(self.config, node.config)
         if r:
             raise AlsaConfigError("cannot add node %s to parent node %s [%s]" % (repr(node.id), repr(self.id), errorcode[-r]))
-        node.parent = self.parent
+        self.shape = None
+        node.parent = self
+        node.top = False
+        self._adopt(node)
 
     def add_before(self, node):
         r = snd_config_add_before(self.config, node.config)
         if r:
             raise AlsaConfigError("cannot add node %s before node %s [%s]" % (repr(node.id), repr(self.id), errorcode[-r]))
+        if not self.parent is None:
+            self.parent.shape = None
         node.parent = self.parent
+        node.top = False
+        self._adopt(node)
 
     def add_after(self, node):
         r = snd_config_add_after(self.config, node.config)
         if r:
             raise AlsaConfigError("cannot add node %s after node %s [%s]" % (repr(node.id), repr(self.id), errorcode[-r]))
+        if not self.parent is None:
+            self.parent.shape = None
         node.parent = self.parent
+        node.top = False
+        self._adopt(node)
 
 class AlsaConfigTreeIterator:
+    """Cursor over the children of a compound node.
+
+    The compound moves the active cursors when the children are inserted
+    or removed, so the tree can be modified while iterating:
+
+    - the current node may be removed, the iteration continues with
+      the node which followed it
+    - removed nodes which were not visited yet are skipped
+    - nodes inserted after the current node are visited, nodes inserted
+      before the current node are not
+
+    A node appended after the last visited node is visited in the same
+    pass, so the siblings produced by If or Include blocks are evaluated
+    in the current pass.
+    """
 
     def __init__(self, node):
         self.node = node
-        self.next = None
+        self.pos = 0
+        if node.cursors is None:
+            node.cursors = WeakSet()
+        node.cursors.add(self)
+
+    def __iter__(self):
+        return self
 
     def __next__(self):
-        n = self.next
-        if n is None:
-            if len(self.node.val) == 0:
-                raise StopIteration
-            n = self.node.val[0]
-        if n == -1:
+        node = self.node
+        share = node.share
+        # the positions are kept when the copy-on-write compound is unshared
+        val = node.val if share is None else share.val
+        pos = self.pos
+        if pos >= len(val):
+            cursors = node.cursors
+            cursors.discard(self)
+            if not cursors:
+                node.cursors = None
             raise StopIteration
-        idx = self.node.val.index(n)
-        if len(self.node.val) > idx + 1:
-            self.next = self.node.val[idx + 1]
-        else:
-            self.next = -1
-        return n
+        self.pos = pos + 1
+        if share is None:
+            return val[pos]
+        return node._view(val[pos])
 
 class AlsaConfigTree(AlsaConfigBase):
-    """This is fully cached configuration tree which may be extended."""
+    """This is fully cached configuration tree which may be extended.
+
+    The copies of the frozen (read-only) trees are copy-on-write: a copied
+    compound keeps a reference to the source compound in share. The reads
+    return the views of the source children, which are kept only weakly
+    (in ids) while they are referenced, so a traversal does not copy the
+    tree. The first modification (writable()) creates the child lists
+    of the shared compounds on the path to the top (unshare), the live
+    views become the children.
+
+    The nodes use __slots__ and interned identifiers to save memory.
+
+    The position of a node in the parent list is found through the
+    active cursors or the idx hint (see _index()), so removing the
+    current node or inserting next to the last inserted node does not
+    scan the children."""
+
+    __slots__ = ('parent', 'id', 'type', 'val', 'ids', 'cursors', 'share', 'frozen', 'top', 'shape', 'hash', 'idx', '__weakref__')
 
     def __init__(self, parent=None):
         self.parent = parent
         self.id = None
         self.type = None
         self.val = None
+        self.ids = None
+        self.cursors = None
+        self.share = None
+        self.frozen = False
         self.top = False
+        self.shape = None
+        self.hash = None
+        self.idx = 0
 
     def __iter__(self):
         if self.type == SND_CONFIG_TYPE_COMPOUND:
@@ -392,106 +1115,470 @@ class AlsaConfigTree(AlsaConfigBase):
         id = node
         if type(node) != type(''):
             id = node.id
-        for v in self.val:
-            if v.id == id:
-                return True
-        return False
+        if not self.share is None:
+            return id in self.share.ids
+        return id in self.ids
 
     def __getitem__(self, key):
         if self.type == SND_CONFIG_TYPE_COMPOUND:
-            for n in self.val:
-                if n.id == key:
-                    return n
-            raise AlsaConfigError("compound id '%s' not found" % key)
+            try:
+                if not self.share is None:
+                    return self._view(self.share.ids[key])
+                return self.ids[key]
+            except KeyError:
+                raise AlsaConfigError("compound id '%s' not found" % key)
         raise AlsaConfigError("only compound nodes implements __getitem__")
 
     def __len__(self):
         if not self.is_compound():
             raise AlsaConfigError("node %s is not a compound" % self.full_id())
+        if not self.share is None:
+            return len(self.share.val)
         return len(self.val)
 
+    def get(self, key, default=None):
+        """Return the child node or default"""
+        if self.type != SND_CONFIG_TYPE_COMPOUND:
+            raise AlsaConfigError("only compound nodes implement get")
+        if not self.share is None:
+            if not key in self.share.ids:
+                return default
+            return self._view(self.share.ids[key])
+        return self.ids.get(key, default)
+
+    def get_shape(self):
+        if not self.share is None:
+            return self.share.get_shape()
+        return super().get_shape()
+
+    def _view(self, src):
+        """Return the node for the child src of the shared source compound"""
+        views = self.ids
+        if views is None:
+            views = self.ids = WeakValueDictionary()
+        n = views.get(src.id)
+        if n is None:
+            n = self.__class__(self)
+            n.id = src.id
+            n.type = src.type
+            n.hash = src.hash
+            if src.type == SND_CONFIG_TYPE_COMPOUND:
+                n.share = src
+            else:
+                n.val = src.val
+            n.idx = src.idx
+            views[n.id] = n
+        return n
+
+    def unshare(self):
+        """Create the child nodes of the copy-on-write compound"""
+        src = self.share
+        views = self.ids
+        self.share = None
+        cls = self.__class__
+        self.val = val = []
+        self.ids = ids = {}
+        for s in src.val:
+            n = None
+            if views:
+                n = views.get(s.id)
+            if n is None:
+                n = cls(self)
+                n.id = s.id
+                n.type = s.type
+                n.hash = s.hash
+                if s.type == SND_CONFIG_TYPE_COMPOUND:
+                    n.share = s
+                else:
+                    n.val = s.val
+            n.idx = len(val)
+            val.append(n)
+            ids[n.id] = n
+
+    def attach(self):
+        """Unshare the copy-on-write compounds up to the top, so this node
+        (a view) is kept by its parent"""
+        path = []
+        n = self.parent
+        while not n is None and not n.share is None:
+            path.append(n)
+            n = n.parent
+        for n in reversed(path):
+            n.unshare()
+
+    def freeze(self):
+        """Make the tree read-only, the copies will share the nodes"""
+        for n in self.walk():
+            # the children of the frozen copies must be kept
+            if not n.share is None:
+                n.unshare()
+            n.frozen = True
+
+    def writable(self):
+        if self.frozen:
+            raise AlsaConfigError("node %s is read-only" % self.full_id())
+        self.attach()
+
+    def changed(self):
+        """Drop the cached shape and the subtree hashes up to the top"""
+        self.shape = None
+        node = self
+        while not node is None and not node.hash is None:
+            node.hash = None
+            node = node.parent
+
+    def digest(self):
+        """Return the content hash of the subtree (Merkle tree).
+
+        The hashes are cached in the nodes and dropped when the subtree
+        is modified. The identifier of this node is not hashed, so equal
+        subtrees with different identifiers have the same digest."""
+        import hashlib
+        stack = [(self, False)]
+        while stack:
+            node, ready = stack.pop()
+            if not node.hash is None:
+                continue
+            if node.type != SND_CONFIG_TYPE_COMPOUND:
+                v = '%s %s' % (node.type, repr(node.val))
+                node.hash = hashlib.blake2b(v.encode('utf-8'), digest_size=16).digest()
+            elif not node.share is None:
+                node.hash = node.share.digest()
+            elif ready:
+                h = hashlib.blake2b(b'compound', digest_size=16)
+                for n in node.val:
+                    id = repr(n.id).encode('utf-8')
+                    h.update(b'%d:%s' % (len(id), id))
+                    h.update(n.hash)
+                node.hash = h.digest()
+            else:
+                stack.append((node, True))
+                for n in node.val:
+                    if n.hash is None:
+                        stack.append((n, False))
+        return self.hash
+
+    def _index(self, node):
+        """Return the position of the child node.
+
+        The idx hint of the node is tried first, then the nodes last
+        returned by the active cursors. The hints of all children are
+        renumbered when both miss."""
+        val = self.val
+        i = node.idx
+        if i < len(val) and val[i] is node:
+            return i
+        if self.cursors:
+            for c in self.cursors:
+                i = c.pos - 1
+                if i >= 0 and i < len(val) and val[i] is node:
+                    node.idx = i
+                    return i
+        for i, n in enumerate(val):
+            n.idx = i
+        if node.idx >= len(val) or not val[node.idx] is node:
+            raise AlsaConfigError("node %s is not in the parent" % node.full_id())
+        return node.idx
+
+    def _move_cursors(self, idx, delta):
+        """Shift the active iterators after an insert or remove at idx"""
+        for c in self.cursors:
+            if c.pos > idx:
+                c.pos += delta
+
     def set_id(self, id):
         """Set new id string"""
-        id = str(id)
+        id = sys.intern(str(id))
         if self.id == id:
             return
-        if self.parent:
-            for n in self.parent.val:
-                if n.id == id:
-                    raise AlsaConfigError("parent %s has already identical identifier %s" % (self.full_id(), id))
+        self.writable()
+        parent = self.parent
+        if not parent is None:
+            if id in parent.ids:
+                raise AlsaConfigError("parent %s has already identical identifier %s" % (self.full_id(), id))
+            if parent.ids.get(self.id) is self:
+                del parent.ids[self.id]
+                parent.ids[id] = self
+            parent.changed()
         self.id = id
 
-    def _load(self, c):
+    # one line of the snd_config_save() output: a closing bracket, or an
+    # optional dotted id path followed by an opening bracket or a value
+    # (compiled on the first use)
+    re_saved = None
+    re_saved_id = None
+
+    def _export(self, c):
+        """Convert the C tree using one snd_config_save() call.
+
+        The saved text has one node per line, so it is decoded line by line
+        instead of using the generic AlsaConfigParser. Escaped strings and
+        real numbers are not guaranteed to survive the text round-trip
+        (the reals are saved with %g, so 2.0 looks like an integer), so
+        the type of the numeric nodes is taken from the C nodes and False
+        is returned for the reals. The caller must walk the C tree then."""
+        text = c.dumps()
+        if text.find('\\') >= 0:
+            return False
+        cls = AlsaConfigTree
+        if cls.re_saved is None:
+            id = r"""(?:'[^'\n]*'|"[^"\n]*"|[^ \t\n'"{}\[\].]+)"""
+            val = r"""(?:'[^'\n]*'|"[^"\n]*"|[^ \t\n'"{}\[\]]+)"""
+            cls.re_saved = re.compile(r'[ \t]*(?:([}\]])|(?:(%s(?:\.%s)*)[ \t]+)?(?:([{\[])|(%s))?)[ \t]*(?:\n|$)' % (id, id, val))
+            cls.re_saved_id = re.compile(id)
+        split = cls.re_saved_id.findall
+        compounds = {}
+        p = c_void_p()
+
+        def ctype(t, id):
+            # the type of the C node (t is the parent compound)
+            config = compounds.get(t)
+            if config is None:
+                ids = []
+                n = t
+                while not n is self:
+                    if n.id.find('.') >= 0:
+                        return None
+                    ids.append(n.id)
+                    n = n.parent
+                if ids:
+                    ids.reverse()
+                    if snd_config_search(c.config, '.'.join(ids).encode('utf-8'), byref(p)):
+                        return None
+                    config = p.value
+                else:
+                    config = c.config.value
+                compounds[t] = config
+            if snd_config_search(config, id.encode('utf-8'), byref(p)):
+                return None
+            return snd_config_get_type(p)
 
-        def val(t, o):
-            t.id = o.id
-            t.type = o.type
-            if not o.is_compound():
-                t.val = o.value()
+        self.id = c.id
+        self.make_compound()
+        cls = self.__class__
+        stack = []
+        parent = self
+        array = False
+        pos = 0
+        for m in cls.re_saved.finditer(text):
+            if m.start() != pos:
+                return False
+            pos = m.end()
+            close, path, open, val = m.groups()
+            if close:
+                if not stack or (close == ']') != array:
+                    return False
+                parent, array = stack.pop()
+                continue
+            if open is None and val is None:
+                if path is None:
+                    continue
+                return False
+            t = parent
+            if array:
+                if not path is None:
+                    return False
+                id = str(len(t.val))
+            elif path is None:
+                return False
+            elif path.find('.') < 0 and path[0] not in '\'"':
+                id = path
             else:
-                t.val = []
-                for n in o:
-                    ac = self.__class__(t)
-                    t.val.append(ac)
-                    val(ac, n)
+                ids = [id[0] in '\'"' and id[1:-1] or id for id in split(path)]
+                id = ids.pop()
+                for id2 in ids:
+                    n = t.ids.get(id2)
+                    if n is None:
+                        n = cls(t)
+                        n.id = sys.intern(id2)
+                        n.type = SND_CONFIG_TYPE_COMPOUND
+                        n.val = []
+                        n.ids = {}
+                        n.idx = len(t.val)
+                        t.val.append(n)
+                        t.ids[n.id] = n
+                    elif n.type != SND_CONFIG_TYPE_COMPOUND:
+                        return False
+                    t = n
+            if id in t.ids:
+                return False
+            n = cls(t)
+            n.id = sys.intern(id)
+            if not open is None:
+                n.type = SND_CONFIG_TYPE_COMPOUND
+                n.val = []
+                n.ids = {}
+            elif val[0] in '\'"':
+                n.type = SND_CONFIG_TYPE_STRING
+                n.val = sys.intern(val[1:-1])
+            elif val[0] in '0123456789-':
+                try:
+                    v = int(val)
+                except ValueError:
+                    return False
+                if id.find('.') >= 0:
+                    return False
+                n.type = ALSACONFIG_TYPE_CODES.get(ctype(t, id))
+                if n.type != SND_CONFIG_TYPE_INTEGER and n.type != SND_CONFIG_TYPE_INTEGER64:
+                    return False
+                n.val = v
+            else:
+                n.type = SND_CONFIG_TYPE_STRING
+                n.val = sys.intern(val)
+            n.idx = len(t.val)
+            t.val.append(n)
+            t.ids[n.id] = n
+            t = n
+            if not open is None:
+                stack.append((parent, array))
+                parent = t
+                array = open == '['
+        if stack or pos != len(text):
+            return False
+        self.changed()
+        return True
+
+    def _walk(self, c):
+        """Convert the C tree node by node using the raw pointers.
 
+        The C tree is walked without the AlsaConfig wrappers, so walk()
+        is not used here, the compounds are queued to a stack instead."""
+        cls = self.__class__
+        id = c_char_p()
+        stack = []
+
+        def val(t, config):
+            if snd_config_get_id(config, byref(id)):
+                raise AlsaConfigError("unable to get config id")
+            t.id = id.value and sys.intern(id.value.decode('utf-8')) or None
+            ctype = snd_config_get_type(config)
+            t.type = ALSACONFIG_TYPE_CODES.get(ctype, ctype)
+            if t.type != SND_CONFIG_TYPE_COMPOUND:
+                t.val = config_get_value(config, t.type)
+            else:
+                t.val = []
+                t.ids = {}
+                t.changed()
+                stack.append((t, config))
+
+        val(self, c.config)
+        while stack:
+            t, config = stack.pop()
+            i = snd_config_iterator_first(config)
+            end = snd_config_iterator_end(config)
+            while i != end:
+                ac = cls(t)
+                val(ac, snd_config_iterator_entry(i))
+                ac.idx = len(t.val)
+                t.val.append(ac)
+                t.ids[ac.id] = ac
+                i = snd_config_iterator_next(i)
+
+    def _load(self, c, bulk=True):
         self.top = True
-        val(self, c)
+        if not bulk or not c.is_compound() or not self._export(c):
+            self._walk(c)
+        self.loaded()
 
-    def load(self, filename):
+    def _parse(self, text, filename=None, override=False):
+        self.top = True
+        self.id = None
+        self.make_compound()
+        AlsaConfigParser(self, filename, override).parse(text)
+        self.loaded()
+
+    def _load_file(self, filename, backend):
+        if backend == 'python':
+            with open(filename, encoding='utf-8', newline='') as fp:
+                return self._parse(fp.read(), filename)
+        with AlsaConfig() as c:
+            c.load(filename)
+            return self._load(c)
+
+    def loaded(self):
+        """A notifier that the tree was loaded to override."""
+        pass
+
+    def load(self, filename, backend=None, cache=True):
         """Load configuration from a file"""
-        c = AlsaConfig()
-        c.load(filename)
-        return self._load(c)
-
-    def loads(self, text):
-        """Load configuration from a string"""
-        c = AlsaConfig()
-        c.loads(text)
-        return self._load(c)
-
-    def copy(self):
-        """Create a new duplicate value"""
-
-        def one(dst, src):
-            dst.id = src.id
-            dst.type = src.type
-            dst.top = src.top
-            if not dst.is_compound():
-                dst.val = src.val
+        backend = config_backend(backend)
+        if cache:
+            tree = get_config_cache().get(filename, backend)
+            if not tree is None:
+                self._copy(tree)
+                self.top = True
+                self.loaded()
+                return
+        self._load_file(filename, backend)
+
+    def loads(self, text, backend=None, override=False):
+        """Load configuration from a string or a bytes-like object"""
+        if config_backend(backend) == 'python':
+            if not isinstance(text, str):
+                text = str(text, 'utf-8')
+            return self._parse(text, None, override)
+        with AlsaConfig() as c:
+            c.loads(text, override)
+            return self._load(c)
+
+    def _copy(self, src):
+        """Copy the contents of the src tree to this node"""
+        cls = self.__class__
+        self.changed()
+
+        def shared(node):
+            return node.frozen or not node.share is None
+
+        # the copied compounds by id() of the source compound
+        dsts = {}
+        for s in src.walk(prune=shared):
+            if s is src:
+                dst = self
+            else:
+                parent = dsts[id(s.parent)]
+                dst = cls(parent)
+                dst.idx = len(parent.val)
+                parent.val.append(dst)
+                parent.ids[s.id] = dst
+            dst.id = s.id
+            dst.type = s.type
+            dst.top = s.top
+            dst.val = dst.ids = dst.share = dst.shape = None
+            dst.hash = s.hash
+            if dst.type != SND_CONFIG_TYPE_COMPOUND:
+                dst.val = s.val
+            elif not s.share is None:
+                dst.share = s.share
+            elif s.frozen:
+                dst.share = s
             else:
                 dst.val = []
-                for src2 in src:
-                    dst2 = self.__class__(dst)
-                    dst.val.append(dst2)
-                    one(dst2, src2)
-                    dst2.post()
+                dst.ids = {}
+                dsts[id(s)] = dst
 
+    def copy(self):
+        """Create a new duplicate value"""
         c = self.__class__()
-        one(c, self)
+        c._copy(self)
         return c
 
     def remove(self):
         """Remove this node from the parent"""
         if self.parent is None:
             raise AlsaConfigError("node %s has not a parent" % self.full_id())
-        self.parent.val.remove(self)
+        self.writable()
+        parent = self.parent
+        idx = parent._index(self)
+        del parent.val[idx]
+        del parent.ids[self.id]
+        parent.changed()
+        if parent.cursors:
+            parent._move_cursors(idx, -1)
         self.parent = None
 
-    def dumps(self):
-        """Save (dump) configuration to a string"""
-
-        def one(n):
-            if n.is_compound():
-                r = ''
-                for n2 in n:
-                    r += one(n2)
-            else:
-                r = '%s %s\n' % (n.full_id(), repr(n.value()))
-            return r
-
-        r = one(self)
-        return r
+    def dumps(self, alsa=False):
+        """Save (dump) configuration to a string (see iterdump())"""
+        return ''.join(self.iterdump(alsa))
 
     def value(self):
         
@@ -511,32 +1598,689 @@ class AlsaConfigTree(AlsaConfigBase):
     def add(self, node):
         if not self.is_compound():
             raise AlsaConfigError("node %s is not a compound" % self.full_id())
-        if node in self:
+        self.writable()
+        if not self.share is None:
+            self.unshare()
+        if node.id in self.ids:
             raise AlsaConfigError("id '%s' already in parent node %s" % (node.id, self.full_id()))
         node.parent = self
+        node.idx = len(self.val)
         self.val.append(node)
+        self.ids[node.id] = node
+        self.changed()
 
     def add_before(self, node):
         if self.parent is None:
             raise AlsaConfigError("node %s has not a parent" % self.full_id())
-        if node in self.parent:
+        self.writable()
+        if node.id in self.parent.ids:
             raise AlsaConfigError("id '%s' already in parent node %s" % (node.id, self.parent.full_id()))
-        idx = self.parent.val.index(self)
-        self.parent.val.insert(idx, node)
-        node.parent = self.parent
+        parent = self.parent
+        idx = parent._index(self)
+        parent.val.insert(idx, node)
+        node.idx = idx
+        self.idx = idx + 1
+        parent.ids[node.id] = node
+        parent.changed()
+        if parent.cursors:
+            parent._move_cursors(idx, 1)
+        node.parent = parent
 
     def add_after(self, node):
         if self.parent is None:
             raise AlsaConfigError("node %s has not a parent" % self.full_id())
-        if node in self.parent:
+        self.writable()
+        if node.id in self.parent.ids:
             raise AlsaConfigError("id '%s' already in parent node %s" % (node.id, self.parent.full_id()))
-        idx = self.parent.val.index(self)
-        self.parent.val.insert(idx + 1, node)
-        node.parent = self.parent
+        parent = self.parent
+        idx = parent._index(self) + 1
+        parent.val.insert(idx, node)
+        node.idx = idx
+        parent.ids[node.id] = node
+        parent.changed()
+        if parent.cursors:
+            parent._move_cursors(idx, 1)
+        node.parent = parent
 
     def make_compound(self):
+        self.writable()
         self.type = SND_CONFIG_TYPE_COMPOUND
+        self.share = None
         self.val = []
+        self.ids = {}
+        self.changed()
+
+    def set_value(self, val):
+        """Set new value of the leaf node"""
+        if self.type == SND_CONFIG_TYPE_COMPOUND:
+            raise AlsaConfigError("node %s is a compound" % self.full_id())
+        self.writable()
+        self.val = val
+        self.changed()
+
+def config_diff(a, b):
+    """Compare two configuration trees (AlsaConfigTree).
+
+    Return the list of ('added' | 'removed' | 'changed', path) tuples.
+    The path uses the full_id() format relative to a and b. Only the
+    subtrees with different digests are compared."""
+    r = []
+    stack = [(a, b, '')]
+    while stack:
+        a, b, path = stack.pop()
+        if a.digest() == b.digest():
+            continue
+        if a.type != SND_CONFIG_TYPE_COMPOUND or b.type != SND_CONFIG_TYPE_COMPOUND:
+            r.append(('changed', path))
+            continue
+        # read the copy-on-write compounds without the unshare
+        if not a.share is None:
+            a = a.share
+        if not b.share is None:
+            b = b.share
+        prefix = path and path + '.' or ''
+        found = False
+        nodes = []
+        for n in a.val:
+            n2 = b.ids.get(n.id)
+            if n2 is None:
+                r.append(('removed', prefix + repr(n.id)))
+                found = True
+            elif n.digest() != n2.digest():
+                nodes.append((n, n2, prefix + repr(n.id)))
+                found = True
+        for n in b.val:
+            if not n.id in a.ids:
+                r.append(('added', prefix + repr(n.id)))
+                found = True
+        if not found:
+            # only the order of the children differs
+            r.append(('changed', path))
+        nodes.reverse()
+        stack.extend(nodes)
+    return r
+
+class AlsaConfigCache:
+    """LRU cache of the parsed configuration files.
+
+    The entries are keyed by (realpath, mtime, size) of the loaded file,
+    so the modified files are parsed again (<file> includes are not tracked).
+    The cached trees are never modified, AlsaConfigTree.load() copies them.
+    The memory limit (bytes) is set by the ACONFIG_CACHE_SIZE environment
+    variable, zero disables the cache."""
+
+    def __init__(self, limit=None):
+        if limit is None:
+            limit = int(os.environ.get('ACONFIG_CACHE_SIZE', 64 * 1024 * 1024))
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.trees = OrderedDict()
+        self.paths = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.trees),
+            'size': self.size,
+            'limit': self.limit
+        }
+
+    @staticmethod
+    def sizeof(tree):
+        """Estimate the memory used by the tree"""
+        r = 0
+        stack = [tree]
+        while stack:
+            n = stack.pop()
+            r += sys.getsizeof(n) + sys.getsizeof(n.id) + sys.getsizeof(n.val)
+            if hasattr(n, '__dict__'):
+                r += sys.getsizeof(n.__dict__)
+            if n.type == SND_CONFIG_TYPE_COMPOUND:
+                r += sys.getsizeof(n.ids)
+                stack.extend(n.val)
+        return r
+
+    def remove(self, key):
+        tree, size = self.trees.pop(key)
+        del self.paths[key[0]]
+        self.size -= size
+
+    def get(self, filename, backend):
+        """Return the cached tree or None when the cache cannot be used"""
+        if self.limit <= 0:
+            return get_config_store().get(filename, backend)
+        path = os.path.realpath(filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, st.st_mtime_ns, st.st_size, backend)
+        if key in self.trees:
+            self.hits += 1
+            self.trees.move_to_end(key)
+            return self.trees[key][0]
+        self.misses += 1
+        tree = get_config_store().get(filename, backend)
+        if tree is None:
+            tree = AlsaConfigTree()
+            tree._load_file(filename, backend)
+        tree.freeze()
+        if path in self.paths:
+            self.remove(self.paths[path])
+        size = self.sizeof(tree)
+        if size > self.limit:
+            return tree
+        self.trees[key] = (tree, size)
+        self.paths[path] = key
+        self.size += size
+        while self.size > self.limit:
+            self.remove(next(iter(self.trees)))
+            self.evictions += 1
+        return tree
+
+class AlsaConfigStore(CacheStore):
+    """Persistent cache of the parsed configuration files.
+
+    The trees are saved as (id, type, value) tuples, the key is the
+    backend name and the configuration file contents. The key covers
+    only the file contents, so the files which may include other files
+    (any '<' character) are always parsed."""
+
+    FORMAT = 1
+    MAGIC = b'ACFG' + bytes([FORMAT, marshal.version])
+    ENV = 'ACONFIG_CACHE_DIR'
+
+    @staticmethod
+    def encode(node):
+        if node.type != SND_CONFIG_TYPE_COMPOUND:
+            return (node.id, node.type, node.val)
+        # post-order walk with an explicit stack (deep trees)
+        stack = [(node, iter(node.val), [])]
+        while True:
+            n, it, vals = stack[-1]
+            for c in it:
+                if c.type == SND_CONFIG_TYPE_COMPOUND:
+                    stack.append((c, iter(c.val), []))
+                    break
+                vals.append((c.id, c.type, c.val))
+            else:
+                stack.pop()
+                r = (n.id, n.type, tuple(vals))
+                if not stack:
+                    return r
+                stack[-1][2].append(r)
+
+    @staticmethod
+    def decode(tree, data):
+        cls = tree.__class__
+        tree.id = data[0] and sys.intern(data[0])
+        stack = [(tree, data)]
+        while stack:
+            t, d = stack.pop()
+            t.type = ALSACONFIG_TYPE_CODES.get(d[1], d[1])
+            if t.type == SND_CONFIG_TYPE_COMPOUND:
+                t.val = []
+                t.ids = {}
+                for d2 in d[2]:
+                    n = cls(t)
+                    n.id = d2[0] and sys.intern(d2[0])
+                    n.idx = len(t.val)
+                    t.val.append(n)
+                    t.ids[n.id] = n
+                    stack.append((n, d2))
+            elif t.type == SND_CONFIG_TYPE_STRING:
+                t.val = sys.intern(d[2])
+            elif t.type in ALSACONFIG_TYPES:
+                t.val = d[2]
+            else:
+                raise AlsaConfigError("wrong type %s" % t.type)
+        if not tree.is_compound():
+            raise AlsaConfigError("top node is not a compound")
+        tree.top = True
+
+    def get(self, filename, backend):
+        """Return the tree for filename or None when the cache is disabled"""
+        if not self.path:
+            return None
+        try:
+            with open(filename, 'rb') as fp:
+                text = fp.read()
+        except OSError:
+            return None
+        if text.find(b'<') >= 0:
+            # the included files are not a part of the key
+            self.skipped += 1
+            return None
+        fn = self.filename(backend.encode('utf-8') + b'\0' + text)
+        data = self.read(fn)
+        if not data is None:
+            tree = AlsaConfigTree()
+            try:
+                self.decode(tree, data)
+                self.hits += 1
+                return tree
+            except Exception:
+                self.errors += 1
+        self.misses += 1
+        tree = AlsaConfigTree()
+        if backend == 'python':
+            tree._parse(text.decode('utf-8'), filename)
+        else:
+            tree._load_file(filename, backend)
+        self.save(fn, self.encode(tree))
+        return tree
+
+class AlsaConfigParser:
+    """Pure python parser for the ALSA configuration syntax.
+
+    It follows the snd_config_load() rules from alsa-lib (operation modes,
+    compound merging, array indexes, number conversions and <file> includes)
+    and creates the AlsaConfigTree nodes directly. The override flag is
+    the default mode of all definitions (snd_config_load_override()), it
+    is passed down to the nested compounds like in alsa-lib. The explicit
+    mode characters apply to one definition only."""
+
+    MERGE_CREATE = 0
+    MERGE = 1
+    OVERRIDE = 2
+    DONT_OVERRIDE = 3
+
+    MODES = {
+        '+': MERGE_CREATE,
+        '-': MERGE,
+        '?': DONT_OVERRIDE,
+        '!': OVERRIDE
+    }
+
+    QUOTED = {
+        'n': '\n',
+        't': '\t',
+        'v': '\v',
+        'b': '\b',
+        'r': '\r',
+        'f': '\f'
+    }
+
+    # compiled on the first use (see compile())
+    re_white = None
+    re_string = None
+    re_id = None
+    re_delim = None
+    re_integer = None
+    re_real = None
+    re_hexreal = None
+    re_special = None
+
+    @classmethod
+    def compile(cls):
+        """Compile the regular expressions"""
+        cls.re_white = re.compile(r'(?:[ \f\t\n\r]+|#[^\n]*)*')
+        cls.re_string = re.compile(r'[^ \f\t\n\r=,;{}\[\]\'"\\#]+')
+        cls.re_id = re.compile(r'[^ \f\t\n\r=,;{}\[\]\'"\\#.]+')
+        cls.re_delim = {
+            '"': re.compile(r'[^"\\]*'),
+            "'": re.compile(r"[^'\\]*"),
+            '>': re.compile(r'[^>\\]*')
+        }
+        cls.re_integer = re.compile(r'-?(?:0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)$')
+        cls.re_real = re.compile(r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?$')
+        cls.re_hexreal = re.compile(r'-?0[xX](?:[0-9a-fA-F]+\.?[0-9a-fA-F]*|\.[0-9a-fA-F]+)(?:[pP][+-]?[0-9]+)?$')
+        cls.re_special = re.compile(r'-(?:inf(?:inity)?|nan(?:\([0-9a-zA-Z_]*\))?)$', re.I)
+
+    def __init__(self, top, filename=None, override=False):
+        if self.re_white is None:
+            self.compile()
+        self.top = top
+        self.override = override
+        self.cls = top.__class__
+        self.filename = filename
+        self.text = ''
+        self.pos = 0
+        self.inputs = []
+        self.paths = []
+
+    def error(self, msg):
+        line = self.text.count('\n', 0, self.pos) + 1
+        raise AlsaConfigError("%s:%d: %s" % (self.filename or '<string>', line, msg))
+
+    @staticmethod
+    def topdir():
+        return os.environ.get('ALSA_CONFIG_DIR', '/usr/share/alsa')
+
+    def include(self, name):
+        """Push the included file(s) to the input stack (<name> syntax)"""
+        if name.startswith('searchdir:'):
+            self.paths.append(os.path.join(self.topdir(), name[10:]))
+            return
+        if name.startswith('confdir:'):
+            path = os.path.join(self.topdir(), name[8:])
+        else:
+            path = name
+            if not os.path.isabs(name):
+                for dir in self.paths:
+                    if os.path.exists(os.path.join(dir, name)):
+                        path = os.path.join(dir, name)
+                        break
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                         if f.endswith('.conf') and not f.startswith('.')]
+        else:
+            files = [path]
+        for f in reversed(files):
+            try:
+                with open(f, encoding='utf-8', newline='') as fp:
+                    text = fp.read()
+            except OSError:
+                self.error("cannot access file %s" % f)
+            self.inputs.append((self.text, self.pos, self.filename))
+            self.text = text
+            self.pos = 0
+            self.filename = f
+
+    def nonwhite(self):
+        """Skip white space, comments and includes and return the next character"""
+        while True:
+            pos = self.re_white.match(self.text, self.pos).end()
+            if pos < len(self.text):
+                c = self.text[pos]
+                self.pos = pos
+                if c == '<':
+                    self.pos += 1
+                    self.include(self.delimstring('>'))
+                    continue
+                return c
+            self.pos = pos
+            if not self.inputs:
+                return None
+            self.text, self.pos, self.filename = self.inputs.pop()
+
+    def quotedchar(self):
+        if self.pos >= len(self.text):
+            self.error('unexpected end of file')
+        c = self.text[self.pos]
+        self.pos += 1
+        if c in self.QUOTED:
+            return self.QUOTED[c]
+        if c in '01234567':
+            num = int(c)
+            for i in range(2):
+                c = self.text[self.pos:self.pos+1]
+                if not c or not c in '01234567':
+                    break
+                num = num * 8 + int(c)
+                self.pos += 1
+            return chr(num)
+        if c == 'x':
+            # two digits, alsa-lib maps a-f to 0-5 and others to 0
+            num = 0
+            for i in range(2):
+                if self.pos >= len(self.text):
+                    self.error('unexpected end of file')
+                c = self.text[self.pos]
+                self.pos += 1
+                if c in '0123456789':
+                    num = num * 16 + int(c)
+                elif c in 'abcdef':
+                    num = num * 16 + ord(c) - ord('a')
+                else:
+                    num = num * 16
+            return chr(num)
+        return c
+
+    def delimstring(self, delim):
+        r = []
+        regex = self.re_delim[delim]
+        while True:
+            m = regex.match(self.text, self.pos)
+            r.append(m.group())
+            self.pos = m.end()
+            if self.pos >= len(self.text):
+                self.error('unexpected end of file')
+            c = self.text[self.pos]
+            self.pos += 1
+            if c == delim:
+                s = ''.join(r)
+                if s.find('\0') >= 0:
+                    # stored as the C string
+                    s = s[:s.find('\0')]
+                return s
+            c = self.quotedchar()
+            # the escaped new line (and \n) is skipped like in alsa-lib
+            if c != '\n':
+                r.append(c)
+
+    def getstring(self, id):
+        """Return the next string and a flag if the string was quoted"""
+        c = self.nonwhite()
+        if c is None:
+            self.error('unexpected end of file')
+        if c in '=,;.{}[]\\':
+            self.error('unexpected character %s' % repr(c))
+        if c in '"\'':
+            self.pos += 1
+            return self.delimstring(c), True
+        m = (id and self.re_id or self.re_string).match(self.text, self.pos)
+        self.pos = m.end()
+        return m.group(), False
+
+    def number(self, s):
+        """Convert the string like strtoll() or strtod() or return None"""
+        if self.re_integer.match(s):
+            neg = s[0] == '-'
+            d = neg and s[1:] or s
+            if d[:2] in ('0x', '0X'):
+                v = int(d[2:], 16)
+            elif d[0] == '0' and len(d) > 1:
+                v = int(d[1:], 8)
+            else:
+                v = int(d)
+            v = neg and -v or v
+            if -2**63 <= v < 2**63:
+                if v > INT_MAX:
+                    return SND_CONFIG_TYPE_INTEGER64, v
+                return SND_CONFIG_TYPE_INTEGER, v
+        if self.re_real.match(s):
+            v = float(s)
+            mantissa = s.lower().split('e')[0]
+            if abs(v) == float('inf') or (v == 0 and mantissa.strip('-.0')):
+                # out of range (ERANGE)
+                return None
+            return SND_CONFIG_TYPE_REAL, v
+        if self.re_hexreal.match(s):
+            return SND_CONFIG_TYPE_REAL, float.fromhex(s)
+        if self.re_special.match(s):
+            return SND_CONFIG_TYPE_REAL, float(s.split('(')[0])
+        return None
+
+    def make(self, parent, id, type, val=None):
+        n = self.cls(parent)
+        n.id = sys.intern(id)
+        n.type = type
+        if type == SND_CONFIG_TYPE_COMPOUND:
+            n.val = []
+            n.ids = {}
+        else:
+            n.val = val
+        n.idx = len(parent.val)
+        parent.val.append(n)
+        parent.ids[id] = n
+        parent.changed()
+        return n
+
+    def value(self, n, parent, id, skip):
+        s, quoted = self.getstring(False)
+        if skip:
+            return
+        if not quoted and s[0] in '0123456789-':
+            v = self.number(s)
+            if v is not None:
+                type, v = v
+                if n is None:
+                    self.make(parent, id, type, v)
+                elif type == SND_CONFIG_TYPE_REAL:
+                    if not n.is_real():
+                        self.error('%s is not a real' % id)
+                    n.val = v
+                else:
+                    if not n.is_integer() and not n.is_integer64():
+                        self.error('%s is not an integer' % id)
+                    n.val = v
+                return
+        if n is None:
+            self.make(parent, id, SND_CONFIG_TYPE_STRING, sys.intern(s))
+        else:
+            if not n.is_string():
+                self.error('%s is not a string' % id)
+            n.val = sys.intern(s)
+
+    def compound(self, c, n, parent, id, skip, override):
+        """Parse the {} or [] block"""
+        self.pos += 1
+        if not skip:
+            if not n is None:
+                if not n.is_compound():
+                    self.error('%s is not a compound' % id)
+            else:
+                n = self.make(parent, id, SND_CONFIG_TYPE_COMPOUND)
+        if c == '{':
+            self.defs(n, skip, override)
+            end = '}'
+        else:
+            self.array_defs(n, skip, override)
+            end = ']'
+        c = self.nonwhite()
+        if c is None:
+            self.error('unexpected end of file')
+        if c != end:
+            self.error('unexpected character %s' % repr(c))
+        self.pos += 1
+
+    def separator(self):
+        if self.nonwhite() in (';', ','):
+            self.pos += 1
+
+    def array_def(self, parent, idx, skip, override):
+        id = None
+        if not skip:
+            while str(idx) in parent.ids:
+                if override:
+                    parent.ids[str(idx)].remove()
+                    break
+                idx += 1
+            id = str(idx)
+        c = self.nonwhite()
+        if c in ('{', '['):
+            self.compound(c, None, parent, id, skip, override)
+        else:
+            self.value(None, parent, id, skip)
+        return idx + 1
+
+    def array_defs(self, parent, skip, override):
+        idx = 0
+        while True:
+            c = self.nonwhite()
+            if c is None:
+                self.error('unexpected end of file')
+            if c == ']':
+                return
+            idx = self.array_def(parent, idx, skip, override)
+
+    def define(self, parent, skip, override):
+        while True:
+            c = self.nonwhite()
+            mode = override and self.OVERRIDE or self.MERGE_CREATE
+            if c in self.MODES:
+                mode = self.MODES[c]
+                self.pos += 1
+            id, quoted = self.getstring(True)
+            c = self.nonwhite()
+            if c != '.':
+                break
+            self.pos += 1
+            if skip:
+                continue
+            n = parent.ids.get(id)
+            if not n is None:
+                if mode == self.DONT_OVERRIDE:
+                    skip = True
+                    continue
+                if mode != self.OVERRIDE:
+                    if not n.is_compound():
+                        self.error('%s is not a compound' % id)
+                    parent = n
+                    continue
+                n.remove()
+            if mode == self.MERGE:
+                self.error('%s does not exists' % id)
+            parent = self.make(parent, id, SND_CONFIG_TYPE_COMPOUND)
+        if c == '=':
+            self.pos += 1
+            c = self.nonwhite()
+            if c is None:
+                self.error('unexpected end of file')
+        n = None
+        if not skip:
+            n = parent.ids.get(id)
+            if not n is None:
+                if mode == self.DONT_OVERRIDE:
+                    skip = True
+                    n = None
+                elif mode == self.OVERRIDE:
+                    n.remove()
+                    n = None
+            elif mode == self.MERGE:
+                self.error('%s does not exists' % id)
+        if c in ('{', '['):
+            self.compound(c, n, parent, id, skip, override)
+        else:
+            self.value(n, parent, id, skip)
+        self.separator()
+
+    def defs(self, parent, skip, override):
+        while True:
+            c = self.nonwhite()
+            if c is None or c == '}':
+                return
+            self.define(parent, skip, override)
+
+    def parse(self, text):
+        """Parse the configuration text to the top compound"""
+        self.text = text
+        self.pos = 0
+        self.defs(self.top, False, self.override)
+        c = self.nonwhite()
+        if not c is None:
+            self.error('unexpected character %s' % repr(c))
+
+def get_config_store():
+    """Return the global AlsaConfigStore (created on the first use)"""
+    g = globals()
+    if not 'config_store' in g:
+        g['config_store'] = AlsaConfigStore()
+    return g['config_store']
+
+def get_config_cache():
+    """Return the global AlsaConfigCache (created on the first use)"""
+    g = globals()
+    if not 'config_cache' in g:
+        g['config_cache'] = AlsaConfigCache()
+    return g['config_cache']
+
+def __getattr__(name):
+    # aconfig.config_store and aconfig.config_cache
+    if name == 'config_store':
+        return get_config_store()
+    if name == 'config_cache':
+        return get_config_cache()
+    raise AttributeError("module %s has no attribute %s" % (repr(__name__), repr(name)))
 
 if __name__ == '__main__':
 
@@ -7,7 +7,11 @@
 import os
 import sys
 import re
+import mmap
+import marshal
+from collections.abc import Mapping
 from aconfig import AlsaConfig
+from cachestore import CacheStore
 
 SECTIONS = {
     'Linux Distribution': 'Distro',
@@ -35,10 +39,117 @@ SECTIONS = {
     'Packages installed': 'Packages'
 }
 
+# the sections which fill the card model, parsed in AlsaInfo.load()
+CARD_SECTIONS = ('Soundcards', 'Modopts', 'Amixer', 'Alsactl')
+
+SECTION_HEADER = b'!!--------'
+
+# the card attributes saved by AlsaInfoStore (with the controls)
+CARD_FIELDS = ('id', 'driver', 'name', 'longname', 'mixername', 'components', 'module')
+
 class AlsaInfoError(Exception):
     """Indicates exceptions raised by alsainfo code."""
 
-class AlsaInfoSoundcard:
+# the card attributes indexed by AlsaCardRegistry
+CARD_INDEXES = ('id', 'name', 'driver', 'longname')
+
+class AlsaCardRegistry(dict):
+    """Cards keyed by the card number and indexed by CARD_INDEXES.
+
+    The cards (AlsaCard) update the indexes when the indexed attributes
+    are set, so the parsers may fill them in any order. The lookups
+    return the first registered card like the linear scans did (the
+    registration counter is stored in the card). The dict methods which
+    add or remove the cards go through __setitem__ / __delitem__."""
+
+    def __init__(self):
+        super().__init__()
+        self.index = {}
+        for key in CARD_INDEXES:
+            self.index[key] = {}
+        self.counter = 0
+
+    def __setitem__(self, number, card):
+        if number in self:
+            del self[number]
+        super().__setitem__(number, card)
+        card.order = self.counter
+        self.counter += 1
+        card.registry = self
+        for key in CARD_INDEXES:
+            self.reindex(card, key, None, getattr(card, key, None))
+
+    def __delitem__(self, number):
+        card = self[number]
+        for key in CARD_INDEXES:
+            self.reindex(card, key, getattr(card, key, None), None)
+        card.registry = None
+        del card.order
+        super().__delitem__(number)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        for number, card in dict(*args, **kwargs).items():
+            self[number] = card
+
+    def setdefault(self, number, card):
+        if not number in self:
+            self[number] = card
+        return self[number]
+
+    def pop(self, number, *default):
+        if not number in self:
+            if default:
+                return default[0]
+            raise KeyError(number)
+        card = self[number]
+        del self[number]
+        return card
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): registry is empty')
+        number = list(self)[-1]
+        return number, self.pop(number)
+
+    def clear(self):
+        for number in list(self):
+            del self[number]
+
+    def reindex(self, card, key, old, new):
+        """Move the card in the key index from the old to the new value"""
+        index = self.index[key]
+        if not old is None and old in index:
+            l = index[old]
+            if card in l:
+                l.remove(card)
+            if not l:
+                del index[old]
+        if not new is None:
+            index.setdefault(new, []).append(card)
+
+    def find(self, key, value):
+        """Return the first card with the attribute value or None"""
+        l = self.index[key].get(value)
+        if not l:
+            return None
+        return min(l, key=lambda card: card.order)
+
+class AlsaCard:
+    """Base class of the cards, keeps the registry indexes up to date."""
+
+    registry = None
+    order = None
+
+    def __setattr__(self, name, value):
+        if name in CARD_INDEXES and not self.registry is None:
+            self.registry.reindex(self, name, getattr(self, name, None), value)
+        object.__setattr__(self, name, value)
+
+class AlsaInfoSoundcard(AlsaCard):
 
     def __init__(self, card, parent=None):
         """The class with the soundcard information."""
@@ -58,29 +169,56 @@ class AlsaInfoSoundcard:
         self.mixername = ''
         self.components = ''
         self.module = None
-        self.state = {}
+        self._state = None
+        self.controls = []
+        self.control_index = set()
 
     def getsys(self, path):
         if path == 'class/sound/card%s/device/driver/module' % self.card and self.module:
             return self.module
 
     def getCardIdByName(self, name):
-        for c in self.parent.cards:
-            card = self.parent.cards[c]
-            if card.name == name:
-                return card.id
-        return ''
+        card = self.parent.cards.find('name', name)
+        if card is None:
+            return ''
+        return card.id
+
+    def getCardNumberByName(self, name):
+        card = self.parent.cards.find('name', name)
+        if card is None:
+            return ''
+        return str(card.card)
+
+    @property
+    def state(self):
+        """The full alsactl state (parsed on the first access)"""
+        if self._state is None:
+            tree = getattr(self.parent, 'tree', None)
+            if not tree is None and 'Alsactl' in tree:
+                tree['Alsactl'].load_state()
+            if self._state is None:
+                self._state = {}
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+
+    def get_state(self):
+        """Return the full alsactl state"""
+        return self.state
+
+    def set_controls(self, controls):
+        """Set the (iface, name, index) control list and the lookup index"""
+        self.controls = controls
+        self.control_index = set()
+        for iface, name, index in controls:
+            if isinstance(index, str) and index.isdigit():
+                index = int(index)
+            self.control_index.add((iface, name, index))
 
     def control_exists(self, ctl):
-        base = self.state['control']
-        for a in base:
-            c = base[a]
-            index = 'index' in c and c['index'] or 0
-            if c['iface'] == ctl.iface and \
-               c['name'] == ctl.name and \
-               index == ctl.index:
-                return True
-        return False
+        return ctl.key() in self.control_index
 
 class AlsaInfoDistro:
 
@@ -240,22 +378,147 @@ class AlsaInfoAmixer:
                     continue
                 setattr(c, k, d[k].strip())
 
+ALSACTL_LINE = re.compile(r'[^\n]+')
+ALSACTL_INTEGER = re.compile(r'-?[0-9]+$')
+ALSACTL_WORD = re.compile(r'[A-Za-z_][^ \t{}\[\],;=#\'"]*$')
+
+def alsactl_scalar(s):
+    """Decode the alsactl value (None for the unsupported syntax)"""
+    if s[0] in '\'"':
+        if len(s) < 2 or s[-1] != s[0] or s.find('\\', 1) >= 0:
+            return None
+        return s[1:-1]
+    if ALSACTL_INTEGER.match(s):
+        if len(s.lstrip('-')) > 1 and s.lstrip('-')[0] == '0':
+            return None
+        return int(s)
+    if ALSACTL_WORD.match(s):
+        return s
+    return None
+
+def alsactl_scan(text, values=False):
+    """Extract the control identities from the alsactl store output.
+
+    Return {card_id: [(iface, name, index), ...]} or None when the text
+    does not follow the alsactl output format (use the full parser then).
+    The lines are scanned one by one, only the identifier fields (and
+    the values when requested, appended to the tuples) are decoded,
+    the comment compounds are skipped."""
+    r = {}
+    path = []
+    ctl = None
+    for line in ALSACTL_LINE.finditer(text):
+        line = line.group(0).strip()
+        if not line or line[0] == '#':
+            continue
+        if line == '}':
+            if not path:
+                return None
+            if len(path) == 2 and not ctl is None:
+                if 'value.' in ctl:
+                    ctl['value'] = ctl.pop('value.')
+                t = (ctl.get('iface'), ctl.get('name'), ctl.get('index', 0))
+                if values:
+                    t += (ctl.get('value'),)
+                r[path[0]].append(t)
+                ctl = None
+            path.pop()
+            continue
+        l = line.split(None, 1)
+        if len(l) != 2:
+            return None
+        key, val = l
+        if val == '{':
+            if not path:
+                if not key.startswith('state.') or not ALSACTL_WORD.match(key[6:]) or key.find('.', 6) >= 0:
+                    return None
+                key = key[6:]
+                r.setdefault(key, [])
+            elif len(path) == 1:
+                if key != 'control' and not key.startswith('control.'):
+                    return None
+                ctl = None if key == 'control' else {}
+            elif ctl is None:
+                # only the empty 'control' compound is handled
+                return None
+            elif values and len(path) == 2 and (key == 'value' or key.startswith('value.')):
+                # the compound values are decoded by the full parser
+                return None
+            path.append(key)
+            continue
+        if len(path) != 2 or ctl is None:
+            if len(path) < 2:
+                return None
+            continue
+        if key in ('iface', 'name', 'index'):
+            v = alsactl_scalar(val)
+            if v is None or key in ctl:
+                return None
+            ctl[key] = v
+        elif values and (key == 'value' or key.startswith('value.')):
+            v = alsactl_scalar(val)
+            if v is None:
+                return None
+            if key == 'value':
+                ctl[key] = v
+                continue
+            # value.N items form an array (in order)
+            a = ctl.setdefault('value.', [])
+            if key[6:] != str(len(a)):
+                return None
+            a.append(v)
+    if path:
+        return None
+    return r
+
 class AlsaInfoAlsactl:
 
     def __init__(self, parent, text):
         self.parent = parent
         if text.startswith('--startcollapse--'):
-            text = '\n'.join(text.splitlines()[1:-1])
+            # strip the first and the last line
+            start = text.find('\n') + 1
+            end = len(text)
+            if text.endswith('\n'):
+                end -= 1
+            end = max(text.rfind('\n', start, end), start)
+            text = text[start:end]
         self.text = text
+        self.loaded = False
+        r = None
+        if not parent.full_state:
+            r = alsactl_scan(text)
+        if r is None:
+            self.load_state()
+            return
+        if not r:
+            raise AlsaInfoError('missing state compound')
+        for k in r:
+            c = self.parent.card_by_id(k)
+            c.set_controls(r[k])
+
+    def load_state(self):
+        """Parse the full state (alsa-lib) and set the card states"""
+        if self.loaded:
+            return
         cfg = AlsaConfig()
-        cfg.loads(text)
-        a = cfg.value()
-        del cfg
+        cfg.loads(self.text)
+        a = cfg.view()
         if not 'state' in a:
             raise AlsaInfoError('missing state compound')
+        self.loaded = True
         for k in a['state']:
             c = self.parent.card_by_id(k)
             c.state = a['state'][k]
+            controls = []
+            if 'control' in c.state:
+                ctls = c.state['control']
+                if isinstance(ctls, Mapping):
+                    ctls = ctls.values()
+                for ctl in ctls:
+                    index = 'index' in ctl and ctl['index'] or 0
+                    controls.append((ctl.get('iface'), ctl.get('name'), index))
+            c.set_controls(controls)
 
 class AlsaInfoAllModules:
 
@@ -269,16 +532,104 @@ class AlsaInfoSysfs:
         self.parent = parent
         self.text = text
 
+class AlsaInfoTree(Mapping):
+    """Sections of the alsa-info file (name -> object).
+
+    Only the byte ranges of the sections are known at the load time,
+    the section objects are created on the first access. The file is
+    mapped and indexed on demand when the cards were loaded from
+    AlsaInfoStore."""
+
+    def __init__(self, parent, filename, buf=None, index=None):
+        self.parent = parent
+        self.filename = filename
+        self.buf = buf
+        self.index = index
+        self.sections = {}
+
+    def map(self):
+        """Map the file and index the sections (once)"""
+        if self.index is None:
+            if self.buf is None:
+                self.buf = alsainfo_map(self.filename)
+            self.index = {}
+            for section, start, end in alsainfo_index(self.filename, self.buf):
+                self.index[section] = (start, end)
+        return self.index
+
+    def __getitem__(self, section):
+        if section in self.sections:
+            return self.sections[section]
+        start, end = self.map()[section]
+        return self.parse(section, start, end)
+
+    def __contains__(self, section):
+        # the index only, Mapping.__contains__ would parse the section
+        return section in self.map()
+
+    def __iter__(self):
+        return iter(self.map())
+
+    def __len__(self):
+        return len(self.map())
+
+    def parse(self, section, start, end):
+        """Create the section object from the byte range"""
+        text = self.buf[start:end].decode('utf-8')
+        if text.find('\r') >= 0:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        obj = globals()['AlsaInfo' + section](self.parent, text.strip())
+        self.sections[section] = obj
+        return obj
+
+def alsainfo_map(filename):
+    """Return the read-only mmap of the file (or empty bytes)"""
+    with open(filename, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+def alsainfo_index(filename, buf):
+    """Return the list of [section, start, end] for the alsa-info contents.
+
+    The section starts with the name line followed by the '!!--------'
+    line, the byte range covers the text up to the next section."""
+    r = []
+    pos = 0
+    while 1:
+        pos = buf.find(SECTION_HEADER, pos)
+        if pos < 0:
+            break
+        if pos > 0 and buf[pos-1] != 10:
+            pos += len(SECTION_HEADER)
+            continue
+        lstart = buf.rfind(b'\n', 0, max(pos - 1, 0)) + 1
+        name = buf[lstart+2:pos].decode('utf-8').strip()
+        if not name in SECTIONS:
+            print(buf[lstart:pos].decode('utf-8'))
+            raise AlsaInfoError("%s: unknown section %s" % (filename, repr(name)))
+        if r:
+            r[-1][2] = lstart
+        pos = buf.find(b'\n', pos)
+        pos = len(buf) if pos < 0 else pos + 1
+        r.append([SECTIONS[name], pos, len(buf)])
+    return r
+
 class AlsaInfo:
-    """Parses the output from the alsa-info.sh file."""
+    """Parses the output from the alsa-info.sh file.
 
-    def __init__(self):
+    The alsactl state is scanned only for the control identities, the
+    full state is parsed on the first access to AlsaInfoSoundcard.state
+    or at the load time when full_state is set."""
+
+    def __init__(self, full_state=False):
+        self.full_state = full_state
         self.reset()
 
     def reset(self):
         self.filename = None
         self.tree = {}
-        self.cards = {}
+        self.cards = AlsaCardRegistry()
         self.modules = []
 
     def card(self, card):
@@ -289,31 +640,105 @@ class AlsaInfo:
         return c
 
     def card_by_id(self, id):
-        for card in self.cards:
-            if self.cards[card].id == id:
-                return self.cards[card]
-        raise AlsaInfoError("unable to find card '%s'" % id)
-
-    def load(self, filename):
-        fp = open(filename)
-        backlog = []
-        section = ''
-        while 1:
-            line = fp.readline()
-            if not line:
-                break
-            backlog.append(line)
-            if line.startswith('!!--------'):
-                if section:
-                    cls = globals()['AlsaInfo' + section](self, ''.join(backlog[2:-2]).strip())
-                    self.tree[section] = cls
-                backlog = backlog[-2:]
-                name = backlog[0][2:].strip()
-                if not name in SECTIONS:
-                    print(''.join(backlog))
-                    raise AlsaInfoError("%s: unknown section %s" % (filename, repr(name)))
-                section = SECTIONS[name]
+        card = self.cards.find('id', id)
+        if card is None:
+            raise AlsaInfoError("unable to find card '%s'" % id)
+        return card
+
+    def load(self, filename, cache=True):
+        """Load the alsa-info file.
+
+        The card model is taken from AlsaInfoStore when possible (cache
+        is not False and the full state is not requested), otherwise the
+        file is parsed (see parse())."""
+        self.filename = filename
+        if cache and not self.full_state and get_info_store().get(self, filename):
+            return
+        self.parse(filename, alsainfo_map(filename))
+
+    def parse(self, filename, buf):
+        """Parse the alsa-info contents.
+
+        The section headers are indexed in one pass. The sections
+        describing the cards (CARD_SECTIONS) are parsed here, the other
+        ones on the first access through tree."""
+        index = alsainfo_index(filename, buf)
+        self.tree = AlsaInfoTree(self, filename, buf, {})
+        for section, start, end in index:
+            self.tree.index[section] = (start, end)
+            if section in CARD_SECTIONS:
+                self.tree.parse(section, start, end)
         # a bit heuristic, should be improved
         for c in self.cards:
             if self.modules:
                 self.cards[c].module = self.modules.pop(0)
+
+class AlsaInfoStore(CacheStore):
+    """Persistent cache of the card model parsed from the alsa-info files.
+
+    The cards (CARD_FIELDS and the control identities) are saved as
+    tuples, the key is the alsa-info file contents. The directory is set
+    by the ALSAINFO_CACHE_DIR environment variable or the --cache option
+    of the tools."""
+
+    FORMAT = 1
+    MAGIC = b'AINF' + bytes([FORMAT, marshal.version])
+    ENV = 'ALSAINFO_CACHE_DIR'
+
+    @staticmethod
+    def encode(info):
+        cards = []
+        for number in info.cards:
+            card = info.cards[number]
+            fields = tuple([getattr(card, f) for f in CARD_FIELDS])
+            cards.append((number, fields, tuple(card.controls)))
+        return (tuple(cards), tuple(info.modules))
+
+    @staticmethod
+    def decode(info, data):
+        cards, modules = data
+        for number, fields, controls in cards:
+            card = info.card(number)
+            for f, v in zip(CARD_FIELDS, fields):
+                setattr(card, f, v)
+            card.set_controls([tuple(c) for c in controls])
+        info.modules = list(modules)
+
+    def get(self, info, filename):
+        """Load the cards for filename to info, False when the cache is disabled"""
+        if not self.path:
+            return False
+        try:
+            with open(filename, 'rb') as fp:
+                text = fp.read()
+        except OSError:
+            return False
+        fn = self.filename(text)
+        data = self.read(fn)
+        if not data is None:
+            try:
+                self.decode(info, data)
+                info.tree = AlsaInfoTree(info, filename)
+                self.hits += 1
+                return True
+            except Exception:
+                self.errors += 1
+                info.reset()
+                info.filename = filename
+        self.misses += 1
+        info.parse(filename, text)
+        self.save(fn, self.encode(info))
+        return True
+
+def get_info_store():
+    """Return the global AlsaInfoStore (created on the first use)"""
+    g = globals()
+    if not 'info_store' in g:
+        g['info_store'] = AlsaInfoStore()
+    return g['info_store']
+
+def __getattr__(name):
+    # alsainfo.info_store
+    if name == 'info_store':
+        return get_info_store()
+    raise AttributeError("module %s has no attribute %s" % (repr(__name__), repr(name)))
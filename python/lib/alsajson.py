@@ -8,6 +8,7 @@ import os
 import sys
 import json
 from ucmlib import AlsaControl
+from alsainfo import AlsaInfoError, AlsaInfoSoundcard, AlsaCard, AlsaCardRegistry
 
 VALID_JSON_FIELDS = [
     'comment', 'id', 'driver', 'name', 'longname', 'mixername', 'module', 'components'
@@ -16,7 +17,7 @@ VALID_JSON_FIELDS = [
 class AlsaJsonError(Exception):
     """Indicates exceptions raised by alsa json code."""
 
-class AlsaJsonSoundcard:
+class AlsaJsonSoundcard(AlsaCard):
 
     def __init__(self, json_id, card):
         """The class with the soundcard information."""
@@ -37,6 +38,7 @@ class AlsaJsonSoundcard:
         self.components = ''
         self.module = ''
         self.controls = []
+        self.control_index = set()
         self.linked = {}
 
     def getsys(self, path):
@@ -48,17 +50,24 @@ class AlsaJsonSoundcard:
             return self.linked[name]
         return ''
 
+    def getCardNumberByName(self, name):
+        id = self.getCardIdByName(name)
+        if not id or self.registry is None:
+            return ''
+        card = self.registry.find('id', id)
+        if card is None:
+            return ''
+        return str(card.card)
+
     def control_exists(self, ctl):
-        for c in self.controls:
-            if c.match(ctl):
-                return True
-        return False
+        return ctl.key() in self.control_index
 
     def load_control(self, control):
         for c in control:
             ctl = AlsaControl()
             ctl.parse(c['id'])
             self.controls.append(ctl)
+            self.control_index.add(ctl.key())
 
     def load_linked(self, linked):
         for l in linked:
@@ -86,7 +95,7 @@ class AlsaJson:
 
     def reset(self):
         self.filename = None
-        self.cards = {}
+        self.cards = AlsaCardRegistry()
 
     def card(self, card):
         if card in self.cards:
@@ -96,10 +105,10 @@ class AlsaJson:
         return c
 
     def card_by_id(self, id):
-        for card in self.cards:
-            if self.cards[card].id == id:
-                return self.cards[card]
-        raise AlsaInfoError("unable to find card '%s'" % id)
+        card = self.cards.find('id', id)
+        if card is None:
+            raise AlsaInfoError("unable to find card '%s'" % id)
+        return card
 
     def load(self, filename):
         self.reset()
@@ -0,0 +1,83 @@
+#! /usr/bin/python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+# cachestore.py - persistent cache of the parsed files
+# Copyright (c) 2020 Jaroslav Kysela <perex@perex.cz>
+
+import os
+import marshal
+
+class CacheStore:
+    """Base class of the persistent caches of the parsed files.
+
+    The parsed data are saved as marshal-ed tuples (prefixed by MAGIC)
+    to files named by the SHA-1 hash of the key (the file contents), so
+    the changed files miss the cache automatically. Files with a different
+    format version or which cannot be decoded are parsed again and
+    overwritten (see read() and save()).
+
+    The store is disabled by default. It is enabled by setting the path
+    (the ENV environment variable or the --cache option of the tools)."""
+
+    MAGIC = b''
+    ENV = None
+
+    def __init__(self, path=None):
+        if path is None and not self.ENV is None:
+            path = os.environ.get(self.ENV)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'hits': self.hits,
+            'misses': self.misses,
+            'skipped': self.skipped,
+            'errors': self.errors
+        }
+
+    def clear(self):
+        """Remove all cached files"""
+        if not self.path or not os.path.isdir(self.path):
+            return
+        for f in os.listdir(self.path):
+            if f.endswith('.bin') or f.endswith('.tmp'):
+                os.unlink(os.path.join(self.path, f))
+
+    def filename(self, key):
+        """Return the cache file name for the key (bytes)"""
+        import hashlib
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + '.bin')
+
+    def read(self, filename):
+        """Return the unmarshal-ed data or None (missing or wrong format)"""
+        try:
+            with open(filename, 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return None
+        if not data:
+            return None
+        if data.startswith(self.MAGIC):
+            try:
+                return marshal.loads(data[len(self.MAGIC):])
+            except Exception:
+                pass
+        self.errors += 1
+        return None
+
+    def save(self, filename, data):
+        """Write the data (atomically, the file is replaced)"""
+        tmp = '%s.%s.tmp' % (filename, os.getpid())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp, 'wb') as fp:
+                fp.write(self.MAGIC)
+                marshal.dump(data, fp)
+            os.replace(tmp, filename)
+        except OSError:
+            self.errors += 1
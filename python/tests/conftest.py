@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ucm-validator'))
+
+import pytest
+
+@pytest.fixture
+def alsalib():
+    """Skip the test when libasound cannot be loaded"""
+    import aconfig
+    try:
+        return aconfig.libasound()
+    except OSError:
+        pytest.skip('libasound is not available')
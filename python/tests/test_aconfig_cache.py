@@ -0,0 +1,77 @@
+import os
+
+import aconfig
+from aconfig import AlsaConfigCache, AlsaConfigTree
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+def cache(monkeypatch, limit):
+    # the persistent store is not used
+    monkeypatch.delenv('ACONFIG_CACHE_DIR', raising=False)
+    monkeypatch.setattr(aconfig, 'config_store', aconfig.AlsaConfigStore())
+    return AlsaConfigCache(limit)
+
+def test_hits(monkeypatch, tmp_path):
+    c = cache(monkeypatch, 1024 * 1024)
+    fn = write(tmp_path / 'a.conf', 'a { b 1 }')
+    t = c.get(fn, 'python')
+    assert c.get(fn, 'python') is t
+    assert t.frozen
+    s = c.stats()
+    assert (s['hits'], s['misses'], s['entries']) == (1, 1, 1)
+    assert s['size'] == AlsaConfigCache.sizeof(t)
+
+def test_mtime(monkeypatch, tmp_path):
+    c = cache(monkeypatch, 1024 * 1024)
+    fn = write(tmp_path / 'a.conf', 'a 1')
+    t = c.get(fn, 'python')
+    write(tmp_path / 'a.conf', 'a 2')
+    st = os.stat(fn)
+    os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    t2 = c.get(fn, 'python')
+    assert not t2 is t
+    assert t2['a'].value() == 2
+    # the old entry for the same path is dropped
+    assert c.stats()['entries'] == 1
+    assert c.size == AlsaConfigCache.sizeof(t2)
+
+def test_lru(monkeypatch, tmp_path):
+    fns = [write(tmp_path / ('%s.conf' % id), '%s 1' % id) for id in 'abc']
+    c = cache(monkeypatch, 1024 * 1024)
+    size = max(c.sizeof(c.get(fn, 'python')) for fn in fns)
+    c = cache(monkeypatch, size * 2)
+    ta = c.get(fns[0], 'python')
+    c.get(fns[1], 'python')
+    assert c.get(fns[0], 'python') is ta
+    c.get(fns[2], 'python')
+    assert c.evictions == 1
+    assert [k[0] for k in c.trees] == [os.path.realpath(fns[0]), os.path.realpath(fns[2])]
+    assert c.size <= c.limit
+
+def test_limit(monkeypatch, tmp_path):
+    fn = write(tmp_path / 'a.conf', ' '.join('a%d %d' % (i, i) for i in range(100)))
+    c = cache(monkeypatch, 100)
+    t = c.get(fn, 'python')
+    assert t['a5'].value() == 5
+    # larger than the limit, not cached
+    assert c.stats()['entries'] == 0 and c.size == 0
+    assert not c.get(fn, 'python') is t
+
+def test_disabled(monkeypatch, tmp_path):
+    c = cache(monkeypatch, 0)
+    fn = write(tmp_path / 'a.conf', 'a 1')
+    assert c.get(fn, 'python') is None
+    assert c.stats()['misses'] == 0
+
+def test_load_copies(monkeypatch, tmp_path):
+    monkeypatch.setattr(aconfig, 'config_cache', cache(monkeypatch, 1024 * 1024))
+    fn = write(tmp_path / 'a.conf', 'a { b 1 }')
+    t1 = AlsaConfigTree()
+    t1.load(fn, 'python')
+    t1['a']['b'].set_value(2)
+    t2 = AlsaConfigTree()
+    t2.load(fn, 'python')
+    assert t2['a']['b'].value() == 1
+    assert aconfig.config_cache.hits == 1
@@ -0,0 +1,113 @@
+import gc
+import weakref
+
+import aconfig
+from aconfig import AlsaConfig
+
+TEXT = 'a { b 1 c { d 2 } } e 3'
+
+def test_close_keeps_removed_node(alsalib):
+    top = AlsaConfig()
+    top.loads(TEXT)
+    a = top['a']
+    d = a['c']['d']
+    a.remove()
+    top.close()
+    # the removed subtree is owned by its wrapper, not by the closed tree
+    assert a.config and a.top
+    assert a.value() == {'b': 1, 'c': {'d': 2}}
+    assert d.value() == 2
+    assert d.root is a
+    assert a['c']['d'] is d
+    a.close()
+    assert not a.config and not d.config
+
+def test_close_keeps_moved_node(alsalib):
+    src = AlsaConfig()
+    src.loads(TEXT)
+    dst = AlsaConfig()
+    dst.loads('x 0')
+    a = src['a']
+    d = a['c']['d']
+    a.remove()
+    dst.add(a)
+    src.close()
+    assert dst.value() == {'x': 0, 'a': {'b': 1, 'c': {'d': 2}}}
+    assert d.value() == 2
+    assert d.root is dst
+    dst.close()
+    assert not a.config and not d.config
+
+def test_move_keeps_other_wrappers(alsalib):
+    src = AlsaConfig()
+    src.loads(TEXT)
+    dst = AlsaConfig()
+    dst.loads('x 0')
+    a = src['a']
+    b = a['b']
+    c = a['c']
+    d = c['d']
+    e = src['e']
+    c.remove()
+    dst.add(c)
+    # only the wrappers of the moved subtree change the owner
+    assert c.root is dst and d.root is dst
+    assert b.root is src and e.root is src
+    assert src['a']['b'] is b and src['e'] is e
+    assert dst['c']['d'] is d
+    src.close()
+    dst.close()
+
+def test_removed_node_is_freed(alsalib, monkeypatch):
+    deleted = []
+    delete = alsalib['snd_config_delete']
+
+    def snd_config_delete(config):
+        deleted.append(config.value)
+        return delete(config)
+
+    monkeypatch.setattr(aconfig, 'snd_config_delete', snd_config_delete)
+    top = AlsaConfig()
+    top.loads(TEXT)
+    a = top['a']
+    a.remove()
+    top.close()
+    config = a.config.value
+    del a
+    gc.collect()
+    # the detached C subtree is freed with its wrapper (no leak)
+    assert config in deleted
+
+def test_close_clears_tree_nodes(alsalib):
+    top = AlsaConfig()
+    top.loads(TEXT)
+    d = top['a']['c']['d']
+    top.close()
+    assert not d.config
+
+def test_load_close_loop(alsalib, monkeypatch):
+    deleted = []
+    delete = alsalib['snd_config_delete']
+
+    def snd_config_delete(config):
+        deleted.append(config.value)
+        return delete(config)
+
+    monkeypatch.setattr(aconfig, 'snd_config_delete', snd_config_delete)
+    refs = []
+    for i in range(2000):
+        top = AlsaConfig()
+        top.loads(TEXT)
+        c = top['a']['c']
+        for n in c:
+            break
+        # the dropped iterator is not kept by the node
+        assert not c.cursors
+        refs.append(weakref.ref(c))
+        refs.append(weakref.ref(n))
+        refs.append(weakref.ref(top))
+        top.close()
+    del top, c, n
+    gc.collect()
+    assert len(deleted) == 2000
+    assert [r for r in refs if not r() is None] == []
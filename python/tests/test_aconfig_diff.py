@@ -0,0 +1,54 @@
+from aconfig import AlsaConfigTree, config_diff
+
+TEXT = 'a { b { c 1 d 2 } e "x" } f [ 1 2 ] g 3'
+
+def tree(text=TEXT):
+    t = AlsaConfigTree()
+    t.loads(text, 'python')
+    return t
+
+def hashes(t):
+    t.digest()
+    return dict((n.full_id(), n.hash) for n in t.walk())
+
+def test_digest_equal():
+    assert tree().digest() == tree().digest()
+    assert tree().digest() != tree('g 3 ' + TEXT.replace(' g 3', '')).digest()
+    # the identifier of the node itself is not hashed
+    assert tree()['a']['b'].digest() == tree('x { c 1 d 2 }')['x'].digest()
+
+def test_digest_leaf_change():
+    t = tree()
+    before = hashes(t)
+    t['a']['b']['c'].set_value(5)
+    after = hashes(t)
+    changed = sorted(k for k in before if before[k] != after[k])
+    assert changed == sorted(n.full_id() for n in (t, t['a'], t['a']['b'], t['a']['b']['c']))
+
+def test_digest_copy():
+    src = tree()
+    src.freeze()
+    c = src.copy()
+    assert c.digest() == src.digest()
+    c['a']['e'].set_value('y')
+    assert c.digest() != src.digest()
+    assert src.digest() == tree().digest()
+
+def test_diff():
+    a = tree()
+    b = tree()
+    assert config_diff(a, b) == []
+    b['a']['b']['c'].set_value(5)
+    b['g'].remove()
+    b['a'].add(tree('h 1')['h'].copy())
+    r = config_diff(a, b)
+    assert sorted(r) == [
+        ('added', "'a'.'h'"),
+        ('changed', "'a'.'b'.'c'"),
+        ('removed', "'g'"),
+    ]
+
+def test_diff_order():
+    a = tree('x 1 y 2')
+    b = tree('y 2 x 1')
+    assert config_diff(a, b) == [('changed', '')]
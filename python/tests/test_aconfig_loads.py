@@ -0,0 +1,65 @@
+import mmap
+
+import pytest
+
+from aconfig import AlsaConfig, AlsaConfigTree, AlsaConfigError
+
+TEXT = 'a { b 1 c "x y" } d [ 2 3 ]\n'
+VALUE = {'a': {'b': 1, 'c': 'x y'}, 'd': [2, 3]}
+
+BUFFERS = [
+    TEXT,
+    TEXT.encode('utf-8'),
+    bytearray(TEXT.encode('utf-8')),
+    memoryview(TEXT.encode('utf-8')),
+    memoryview(bytearray(TEXT.encode('utf-8'))),
+]
+
+@pytest.mark.parametrize('text', BUFFERS, ids=lambda b: type(b).__name__)
+def test_loads_buffer(alsalib, text):
+    with AlsaConfig() as c:
+        c.loads(text)
+        assert c.value() == VALUE
+
+@pytest.mark.parametrize('text', BUFFERS, ids=lambda b: type(b).__name__)
+def test_loads_buffer_python(text):
+    t = AlsaConfigTree()
+    t.loads(text, 'python')
+    assert t.value() == VALUE
+
+def test_loads_not_contiguous(alsalib):
+    m = memoryview(TEXT.encode('utf-8') * 2)[::2]
+    with AlsaConfig() as c:
+        with pytest.raises(AlsaConfigError):
+            c.loads(m)
+
+def test_loads_keeps_buffer(alsalib):
+    buf = bytearray(TEXT.encode('utf-8'))
+    with AlsaConfig() as c:
+        c.loads(buf)
+    assert buf == bytearray(TEXT.encode('utf-8'))
+
+def write(tmp_path, text):
+    fn = tmp_path / 'test.conf'
+    fn.write_text(text)
+    return str(fn)
+
+def test_load_mmap(alsalib, tmp_path):
+    fn = write(tmp_path, TEXT)
+    with AlsaConfig() as c:
+        c.load_mmap(fn)
+        assert c.value() == VALUE
+    with AlsaConfig() as c:
+        c.load_mmap(write(tmp_path, ''))
+        assert len(c) == 0
+
+def test_loads_readonly_mmap(alsalib, tmp_path):
+    fn = write(tmp_path, TEXT)
+    with open(fn, 'rb') as fp:
+        m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with AlsaConfig() as c:
+            c.loads(m)
+            assert c.value() == VALUE
+    finally:
+        m.close()
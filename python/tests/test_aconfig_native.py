@@ -0,0 +1,92 @@
+from aconfig import AlsaConfig, AlsaConfigTree, SND_CONFIG_TYPE_REAL, \
+                    SND_CONFIG_TYPE_INTEGER, SND_CONFIG_TYPE_INTEGER64
+
+TEXT = 'a { b { c 1 } } "a.b" { c 2 } d [ x y ]'
+
+def test_dotted_key_is_path(alsalib):
+    with AlsaConfig() as c:
+        c.loads(TEXT)
+        assert 'a.b' in c
+        assert c['a.b']['c'].value() == 1
+        assert c['a.b.c'].value() == 1
+        assert c['a.b.c'].parent.id == 'b'
+        assert c.get('a.x') is None
+        assert c.get('d.1').value() == 'y'
+
+def test_literal_id(alsalib):
+    with AlsaConfig() as c:
+        c.loads(TEXT)
+        assert c.get_literal('a.b')['c'].value() == 2
+        assert c.get_literal('a.x') is None
+        assert c.get_literal('a').id == 'a'
+
+def test_search_and_query(alsalib):
+    t = AlsaConfigTree()
+    t.loads(TEXT, 'python')
+    with AlsaConfig() as c:
+        c.loads(TEXT)
+        for n in (c, t):
+            assert n.search('a.b.c').value() == 1
+            assert n.query("'a.b'.c")[0].value() == 2
+            assert [x.value() for x in n.query('*.c')] == [2]
+
+def test_tree_literal_id():
+    t = AlsaConfigTree()
+    t.loads(TEXT, 'python')
+    assert t['a.b']['c'].value() == 2
+    assert t.get_literal('a.b') is t['a.b']
+
+def native(ids):
+    c = AlsaConfig()
+    c.loads(' '.join('%s 0' % id for id in ids))
+    return c
+
+def test_native_remove_current(alsalib):
+    with native('abcde') as c:
+        seen = []
+        for n in c:
+            seen.append(n.id)
+            n.remove()
+        assert seen == list('abcde')
+        assert len(c) == 0
+        assert c.cursors is None
+
+def test_native_move_current(alsalib):
+    with native('abc') as c, native('x') as d:
+        seen = []
+        for n in c:
+            seen.append(n.id)
+            n.remove()
+            d.add(n)
+        assert seen == list('abc')
+        assert d.keys() == list('xabc')
+
+def test_native_remove_ahead(alsalib):
+    with native('abcd') as c:
+        seen = []
+        for n in c:
+            seen.append(n.id)
+            if n.id == 'a':
+                c['b'].remove()
+                c['c'].remove()
+        assert seen == list('ad')
+
+def test_export_types(alsalib):
+    text = 'x 2.0 y 3 z 0x7fffffffff a { b 2.0 c [ 4 5.0 ] } "d.e" 1'
+    with AlsaConfig() as c:
+        c.loads(text)
+        t1 = AlsaConfigTree()
+        t1._load(c, bulk=True)
+        t2 = AlsaConfigTree()
+        t2._load(c, bulk=False)
+        for t in (t1, t2):
+            assert t['x'].type == SND_CONFIG_TYPE_REAL
+            assert t['a']['b'].type == SND_CONFIG_TYPE_REAL
+        assert [(n.full_id(), n.type, n.val) for n in t1.leaves()] == \
+               [(n.full_id(), n.type, n.val) for n in t2.leaves()]
+    with AlsaConfig() as c:
+        c.loads('y 3 z 0x7fffffffff a.b [ 4 5 ] s "t"')
+        t = AlsaConfigTree()
+        assert t._export(c)
+        assert t['z'].type == SND_CONFIG_TYPE_INTEGER64
+        assert t['a']['b']['1'].type == SND_CONFIG_TYPE_INTEGER
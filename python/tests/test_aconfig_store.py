@@ -0,0 +1,44 @@
+from aconfig import AlsaConfigStore, AlsaConfigTree
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+def test_disabled_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv('ACONFIG_CACHE_DIR', raising=False)
+    store = AlsaConfigStore()
+    assert store.get(write(tmp_path / 'a.conf', 'a 1'), 'python') is None
+
+def test_round_trip(tmp_path):
+    store = AlsaConfigStore(str(tmp_path / 'store'))
+    fn = write(tmp_path / 'a.conf', 'a [ 1 "x" { b 2 } ] c.d.e "f g" h 0x7fffffffff')
+    t1 = store.get(fn, 'python')
+    t2 = store.get(fn, 'python')
+    assert store.hits == 1 and store.misses == 1
+    assert t1.value() == t2.value()
+    assert t2['c']['d']['e'].parent.parent.parent is t2
+
+def test_deep_tree():
+    depth = 5000
+    top = AlsaConfigTree()
+    top.make_compound()
+    n = top
+    for i in range(depth):
+        c = AlsaConfigTree()
+        c.id = 'a'
+        c.make_compound()
+        n.add(c)
+        n = c
+    t = AlsaConfigTree()
+    AlsaConfigStore.decode(t, AlsaConfigStore.encode(top))
+    n = t
+    for i in range(depth):
+        n = n['a']
+    assert n.is_compound() and len(n) == 0
+
+def test_include_not_stored(tmp_path):
+    store = AlsaConfigStore(str(tmp_path / 'store'))
+    inc = write(tmp_path / 'inc.conf', 'b 1')
+    fn = write(tmp_path / 'a.conf', 'a 1 <%s>' % inc)
+    assert store.get(fn, 'python') is None
+    assert store.skipped == 1
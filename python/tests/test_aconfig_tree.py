@@ -0,0 +1,155 @@
+import gc
+
+from aconfig import AlsaConfigTree, SND_CONFIG_TYPE_INTEGER
+
+def leaf(id, val=0):
+    n = AlsaConfigTree()
+    n.id = id
+    n.type = SND_CONFIG_TYPE_INTEGER
+    n.val = val
+    return n
+
+def tree(ids):
+    t = AlsaConfigTree()
+    t.loads(' '.join('%s 0' % id for id in ids), 'python')
+    return t
+
+def test_remove_current():
+    t = tree('abcde')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        n.remove()
+    assert seen == list('abcde')
+    assert len(t) == 0
+    assert t.cursors is None
+
+def test_remove_current_every_other():
+    t = tree('abcde')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id in ('b', 'd'):
+            n.remove()
+    assert seen == list('abcde')
+    assert t.keys() == list('ace')
+
+def test_move_current():
+    t = tree('abc')
+    d = tree('x')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        n.remove()
+        d.add(n)
+    assert seen == list('abc')
+    assert d.keys() == list('xabc')
+
+def test_remove_ahead():
+    t = tree('abcd')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'a':
+            t['c'].remove()
+    assert seen == list('abd')
+
+def test_remove_visited():
+    t = tree('abcd')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'c':
+            t['a'].remove()
+    assert seen == list('abcd')
+    assert t.keys() == list('bcd')
+
+def test_add_before():
+    t = tree('abc')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'b':
+            n.add_before(leaf('b0'))
+    assert seen == list('abc')
+    assert t.keys() == ['a', 'b0', 'b', 'c']
+
+def test_add_before_ahead():
+    t = tree('abc')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'a':
+            t['c'].add_before(leaf('c0'))
+    assert seen == ['a', 'b', 'c0', 'c']
+
+def test_add_after():
+    t = tree('abc')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'b':
+            n.add_after(leaf('b1'))
+    assert seen == ['a', 'b', 'b1', 'c']
+
+def test_add_after_last():
+    # a sibling appended after the last visited node is visited in the same pass
+    t = tree('ab')
+    seen = []
+    for n in t:
+        seen.append(n.id)
+        if n.id == 'b':
+            n.add_after(leaf('c'))
+        elif n.id == 'c':
+            t.add(leaf('d'))
+    assert seen == list('abcd')
+
+def test_nested_remove():
+    t = tree('abc')
+    seen = []
+    for n in t:
+        for m in t:
+            if n.id == 'a' and m.id == 'b':
+                m.remove()
+        seen.append(n.id)
+    assert seen == ['a', 'c']
+
+def test_break_drops_cursor():
+    t = tree('abc')
+    for n in t:
+        break
+    gc.collect()
+    t['b'].remove()
+    assert t.keys() == ['a', 'c']
+
+def shared_copy():
+    src = AlsaConfigTree()
+    src.loads('a { b { c 1 d 2 } e 3 } f 4', 'python')
+    src.freeze()
+    return src, src.copy()
+
+def test_copy_read_keeps_share():
+    src, t = shared_copy()
+    assert [n.id for n in t.walk()] == [None, 'a', 'b', 'c', 'd', 'e', 'f']
+    assert t['a'].get('b')['c'].value() == 1
+    assert not t.share is None
+    assert t['a'] is t['a']
+
+def test_copy_modify_view():
+    src, t = shared_copy()
+    b = t['a']['b']
+    b['c'].set_value(5)
+    b.remove()
+    t['a']['e'].set_value(6)
+    assert t.value() == {'a': {'e': 6}, 'f': 4}
+    assert src.value() == {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}, 'f': 4}
+
+def test_copy_remove_current():
+    src, t = shared_copy()
+    seen = []
+    for n in t['a']['b']:
+        seen.append(n.id)
+        n.remove()
+    assert seen == ['c', 'd']
+    assert t.value() == {'a': {'b': [], 'e': 3}, 'f': 4}
+    assert src['a']['b'].keys() == ['c', 'd']
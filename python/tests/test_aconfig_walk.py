@@ -0,0 +1,72 @@
+import sys
+
+from aconfig import AlsaConfig, AlsaConfigTree
+
+TEXT = 'a { b { c 1 d 2 } e 3 } f [ 4 5 ] g 6'
+
+PRE = ['', 'a', 'a.b', 'a.b.c', 'a.b.d', 'a.e', 'f', 'f.0', 'f.1', 'g']
+POST = ['a.b.c', 'a.b.d', 'a.b', 'a.e', 'a', 'f.0', 'f.1', 'f', 'g', '']
+
+def tree(text=TEXT):
+    t = AlsaConfigTree()
+    t.loads(text, 'python')
+    return t
+
+def paths(gen):
+    return ['.'.join(path) for path, node in gen]
+
+def test_walk_with_path():
+    t = tree()
+    assert paths(t.walk_with_path()) == PRE
+    assert paths(t.walk_with_path(post=True)) == POST
+    for path, node in t.walk_with_path():
+        assert node.id == (path and path[-1] or None)
+
+def test_walk():
+    t = tree()
+    ids = [n.id for n in t.walk()]
+    assert ids == [p and p.split('.')[-1] or None for p in PRE]
+    ids = [n.id for n in t.walk(post=True)]
+    assert ids == [p and p.split('.')[-1] or None for p in POST]
+
+def test_prune():
+    t = tree()
+    prune = lambda n: n.id in ('b', 'f')
+    assert paths(t.walk_with_path(prune=prune)) == ['', 'a', 'a.b', 'a.e', 'f', 'g']
+    assert paths(t.walk_with_path(True, prune)) == ['a.b', 'a.e', 'a', 'f', 'g', '']
+    assert [n.id for n in t.walk(prune=prune)] == [None, 'a', 'b', 'e', 'f', 'g']
+    assert [n.id for n in t.walk(prune=lambda n: True)] == [None]
+
+def test_leaves():
+    t = tree()
+    assert [n.value() for n in t.leaves()] == [1, 2, 3, 4, 5, 6]
+    assert [n.value() for n in t.leaves(lambda n: n.id == 'b')] == [3, 4, 5, 6]
+    assert [n.value() for n in t['g'].leaves()] == [6]
+
+def test_walk_remove():
+    t = tree()
+    for n in t.walk():
+        if n.id in ('b', 'f'):
+            n.remove()
+    assert t.value() == {'a': {'e': 3}, 'g': 6}
+
+def test_deep_tree():
+    depth = sys.getrecursionlimit() * 3
+    t = tree('')
+    n = t
+    for i in range(depth):
+        c = AlsaConfigTree()
+        c.id = 'x'
+        c.make_compound()
+        n.add(c)
+        n = c
+    assert len(list(t.walk())) == depth + 1
+    assert len(list(t.walk(post=True))) == depth + 1
+    assert max(len(p) for p, n in t.walk_with_path()) == depth
+    assert list(t.leaves()) == []
+
+def test_walk_native(alsalib):
+    with AlsaConfig() as c:
+        c.loads(TEXT)
+        assert paths(c.walk_with_path()) == PRE
+        assert paths(c.walk_with_path(post=True)) == POST
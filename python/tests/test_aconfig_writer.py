@@ -0,0 +1,80 @@
+import io
+import random
+
+from aconfig import AlsaConfigTree, AlsaConfigParser, SND_CONFIG_TYPE_STRING
+
+TEXT = r'''
+A [ a "b c" 'it\'s' "say \"hi\"" ]
+B {
+	x 1
+	y -2.5
+	"e.f" 3
+	z "-12"
+	w 5000000000
+	q "a\tb\\c\001"
+	n "line 1
+line 2"
+	e ''
+	"+id" plus
+	"1x" { "0" 7 }
+	"a=b;c,d" "{x}[y]#z*"
+}
+C [ ]
+D { }
+E [ [ 1 2 ] { k v } ]
+F -inf
+G.H.I "\344\275\240好"
+'''
+
+def dump(t):
+    return [(n.full_id(), n.type, n.val) for n in t.walk() if not n.is_compound()]
+
+def parse(text):
+    t = AlsaConfigTree()
+    t.make_compound()
+    AlsaConfigParser(t).parse(text)
+    return t
+
+def test_round_trip():
+    t = AlsaConfigTree()
+    t.loads(TEXT, 'python')
+    u = parse(t.dumps(alsa=True))
+    assert dump(u) == dump(t)
+    assert u.dumps() == t.dumps()
+    assert u['B']['n'].value() == 'line 1\nline 2'
+    assert u['E'].value() == [[1, 2], {'k': 'v'}]
+
+def test_streaming_write():
+    t = AlsaConfigTree()
+    t.loads(TEXT, 'python')
+    for node in (t, t['B'], t['E'], t['B']['q']):
+        f = io.StringIO()
+        node.write(f, alsa=True)
+        assert f.getvalue() == ''.join(node.iterdump(alsa=True))
+    f = io.StringIO()
+    t.write(f, alsa=True)
+    assert dump(parse(f.getvalue())) == dump(t)
+
+def test_quoted_strings():
+    random.seed(1)
+    for i in range(300):
+        s = ''.join(chr(random.choice((random.randint(1, 130), random.randint(0x100, 0x300))))
+                    for j in range(random.randint(0, 8)))
+        id = ''.join(chr(random.randint(1, 127)) for j in range(random.randint(1, 5)))
+        t = AlsaConfigTree()
+        t.make_compound()
+        n = AlsaConfigTree()
+        n.id = id
+        n.type = SND_CONFIG_TYPE_STRING
+        n.val = s
+        t.add(n)
+        u = parse(t.dumps(alsa=True))
+        assert u.keys() == [id]
+        assert u[id].val == s
+
+def test_round_trip_alsalib(alsalib):
+    t = AlsaConfigTree()
+    t.loads(TEXT, 'python')
+    u = AlsaConfigTree()
+    u.loads(t.dumps(alsa=True), 'alsalib')
+    assert dump(u) == dump(t)
@@ -0,0 +1,146 @@
+import os
+
+from alsainfo import AlsaInfo, AlsaInfoStore, AlsaInfoTree, AlsaInfoSoundcard, \
+                     AlsaCardRegistry, alsactl_scan
+
+TEXT = '''upload=true&script=true&cardinfo=
+!!################################
+!!ALSA Information Script v 0.5.1
+!!################################
+
+!!Linux Distribution
+!!------------------
+
+Fedora release 36 (Thirty Six)
+
+!!Kernel Information
+!!------------------
+
+Kernel release:    5.19.4-200.fc36.x86_64
+'''
+
+def test_contains_does_not_parse(tmp_path):
+    f = tmp_path / 'alsa-info.txt'
+    f.write_text(TEXT)
+    tree = AlsaInfoTree(None, str(f))
+    assert 'Kernel' in tree
+    assert not 'Alsactl' in tree
+    assert list(tree) == ['Distro', 'Kernel']
+    assert tree.sections == {}
+    assert tree['Distro'].text == 'Fedora release 36 (Thirty Six)'
+    assert list(tree.sections) == ['Distro']
+
+STATE = '''state.PCH {
+	control.1 {
+		iface MIXER
+		name 'Master Playback Volume'
+		value 87
+		comment {
+			access 'read write'
+			type INTEGER
+		}
+	}
+	control.2 {
+		iface MIXER
+		name 'Master Playback Switch'
+		value.0 true
+		value.1 false
+	}
+}
+'''
+
+COMPOUND = '''state.PCH {
+	control.1 {
+		iface CARD
+		name 'ELD'
+		value {
+			0 1
+		}
+	}
+}
+'''
+
+def test_alsactl_scan_values():
+    assert alsactl_scan(STATE) == {'PCH': [
+        ('MIXER', 'Master Playback Volume', 0),
+        ('MIXER', 'Master Playback Switch', 0)]}
+    assert alsactl_scan(STATE, True) == {'PCH': [
+        ('MIXER', 'Master Playback Volume', 0, 87),
+        ('MIXER', 'Master Playback Switch', 0, ['true', 'false'])]}
+
+def test_alsactl_scan_compound_value():
+    assert alsactl_scan(COMPOUND) == {'PCH': [('CARD', 'ELD', 0)]}
+    # the compound values are left to the full parser
+    assert alsactl_scan(COMPOUND, True) is None
+
+def card(number, id):
+    c = AlsaInfoSoundcard(number)
+    c.id = id
+    return c
+
+def test_card_registry():
+    r = AlsaCardRegistry()
+    a, b, c = card(0, 'PCH'), card(1, 'HDMI'), card(2, 'PCH')
+    r.update({0: a, 1: b})
+    assert r.setdefault(2, c) is c
+    assert r.setdefault(2, card(3, 'X')) is c
+    assert r.find('id', 'PCH') is a
+    assert r.pop(0) is a
+    assert a.registry is None and a.order is None
+    assert r.find('id', 'PCH') is c
+    r[0] = a
+    # a is registered again, the older card wins now
+    assert r.find('id', 'PCH') is c
+    assert r.popitem() == (0, a)
+    r.clear()
+    assert r == {} and r.find('id', 'HDMI') is None
+    assert b.order is None and c.order is None
+    r |= {5: b}
+    b.id = 'HDMI2'
+    assert r.find('id', 'HDMI2') is b
+
+def info_file():
+    d = os.path.join(os.path.dirname(__file__), '..', 'ucm-validator', 'configs')
+    for path, dirs, files in sorted(os.walk(d)):
+        for f in sorted(files):
+            if f.endswith('.txt'):
+                return os.path.join(path, f)
+
+def test_info_store_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('ALSAINFO_CACHE_DIR', raising=False)
+    store = AlsaInfoStore()
+    assert store.get(AlsaInfo(), info_file()) is False
+
+def test_info_store_round_trip(tmp_path):
+    store = AlsaInfoStore(str(tmp_path))
+    fn = info_file()
+    i1, i2 = AlsaInfo(), AlsaInfo()
+    assert store.get(i1, fn) and store.get(i2, fn)
+    assert store.hits == 1 and store.misses == 1
+    assert AlsaInfoStore.encode(i1) == AlsaInfoStore.encode(i2)
+    # a damaged file is parsed again and overwritten
+    for f in os.listdir(str(tmp_path)):
+        (tmp_path / f).write_bytes(b'AINF')
+    i3 = AlsaInfo()
+    assert store.get(i3, fn)
+    assert store.errors == 1 and store.misses == 2
+    assert AlsaInfoStore.encode(i3) == AlsaInfoStore.encode(i1)
+
+def test_card_state_lazy(alsalib, tmp_path):
+    fn = info_file()
+    i1 = AlsaInfo()
+    i1.load(fn, cache=False)
+    # the full state is parsed on the first access
+    assert not i1.tree['Alsactl'].loaded
+    i2 = AlsaInfo()
+    assert AlsaInfoStore(str(tmp_path)).get(i2, fn)
+    i3 = AlsaInfo(full_state=True)
+    i3.load(fn)
+    for info in (i1, i2, i3):
+        card = info.cards[0]
+        assert card.state['control']
+        assert card.get_state() is card.state
+    assert i1.cards[0].state == i3.cards[0].state
+    assert i1.tree['Alsactl'].loaded
+    card = AlsaInfoSoundcard(0)
+    assert card.state == {}
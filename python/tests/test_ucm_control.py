@@ -0,0 +1,43 @@
+import pytest
+
+from ucmlib import AlsaControl, AlsaControlError, control_id_parse
+from alsainfo import AlsaInfoSoundcard
+from alsajson import AlsaJsonSoundcard
+
+def control(s):
+    ctl = AlsaControl()
+    ctl.parse(s)
+    return ctl
+
+def test_parse():
+    assert control_id_parse("name='Master Playback Switch'") == ('MIXER', 'Master Playback Switch', 0)
+    assert control_id_parse('iface=CARD,name="Headphone Jack",index=1') == ('CARD', 'Headphone Jack', 1)
+    assert control_id_parse("name=Mic,index=02") == ('MIXER', 'Mic', 2)
+
+def test_parse_errors():
+    with pytest.raises(AlsaControlError):
+        control_id_parse("name='Mic',index=x")
+    with pytest.raises(AlsaControlError):
+        control_id_parse("name='Mic',device=0")
+
+def test_key():
+    a = control("name='Mic',index=1")
+    b = control("iface=MIXER,name=\"Mic\",index=1")
+    assert a.key() == b.key() == ('MIXER', 'Mic', 1)
+    assert a.match(b)
+    assert not a.match(control("name='Mic'"))
+
+def test_info_control_index():
+    card = AlsaInfoSoundcard(0)
+    card.set_controls([('MIXER', 'Mic', '1'), ('CARD', 'Headphone Jack', 0)])
+    assert card.control_exists(control("name='Mic',index=1"))
+    assert card.control_exists(control("iface=CARD,name='Headphone Jack'"))
+    assert not card.control_exists(control("name='Mic'"))
+    assert not card.control_exists(control("name='Headphone Jack'"))
+
+def test_json_control_index():
+    card = AlsaJsonSoundcard('x', 0)
+    card.load_control([{'id': "name='Mic',index=1"}, {'id': "iface=CARD,name='Headphone Jack'"}])
+    assert card.control_exists(control("name=Mic,index=1"))
+    assert card.control_exists(control("iface=CARD,name=\"Headphone Jack\",index=0"))
+    assert not card.control_exists(control("name='Mic'"))
@@ -0,0 +1,111 @@
+import gc
+import weakref
+
+import pytest
+
+from ucmlib import Ucm, AlsaConfigUcmNative
+
+MAIN = '''
+Syntax 4
+Define.var "abc"
+Define.other "zz"
+If.first {
+	Condition { Type String String1 "${var:var}" String2 "abc" }
+	True {
+		Include.i1.File "inc1.conf"
+		X.a "${var:other}"
+		If.nested {
+			Condition { Type String Empty "" }
+			True.Y.b 1
+			False.Y.c 2
+		}
+	}
+	False.X.b 2
+}
+SectionUseCase."HiFi" { File "HiFi.conf" Comment "x" }
+Include.i2 {
+	File "inc2.conf"
+	Before.SectionUseCase "HiFi"
+}
+Arr [ 1 2 ]
+'''
+
+INC1 = '''
+Define.fromInc "q"
+Z { a 1 b "${var:fromInc}" }
+If.inner {
+	Condition { Type String String1 "a" String2 "b" }
+	True.Z.c 3
+	False.Z.d 4
+}
+Arr [ 3 ]
+'''
+
+INC2 = '''
+SectionUseCase."Voice" { File "Voice.conf" Comment "y" }
+'''
+
+class TraceUcm(Ucm):
+
+    def condition_ran(self, condition_node, result, true_node, false_node, origin):
+        self.conds.append((condition_node.origin_id(), result))
+
+def evaluate(tmp_path, native):
+    (tmp_path / 'ucm.conf').write_text('')
+    d = tmp_path / 'conf.d' / 'x'
+    d.mkdir(parents=True, exist_ok=True)
+    for name, text in (('main', MAIN), ('inc1', INC1), ('inc2', INC2)):
+        (d / (name + '.conf')).write_text(text)
+    u = TraceUcm(verify=True, native=native)
+    u.conds = []
+    u.reset()
+    u.filename = str(d / 'main.conf')
+    u.syntax = 4
+    c = u.new_config()
+    c.load(u.filename)
+    u.evaluate_inplace(c)
+    return u, c
+
+def test_native_evaluation(alsalib, tmp_path):
+    u, t = evaluate(tmp_path, False)
+    n, c = evaluate(tmp_path, True)
+    assert isinstance(c, AlsaConfigUcmNative)
+    assert c.value() == t.value()
+    assert c.keys() == t.keys()
+    assert sorted(n.conds) == sorted(u.conds)
+    assert n.var == u.var
+    c.close()
+
+def test_native_wrappers_freed(alsalib, tmp_path):
+    n, c = evaluate(tmp_path, True)
+    refs = [weakref.ref(x) for x in c.walk()]
+    c.close()
+    del n, c
+    gc.collect()
+    assert [r for r in refs if not r() is None] == []
+
+DOTTED = '''
+Syntax 4
+SectionDevice."Speaker.1" { Comment "a" }
+If.dot {
+	Condition { Type String Empty "" }
+	True.SectionDevice."Speaker.1".Value.x 1
+}
+'''
+
+@pytest.mark.parametrize('native', (False, True))
+def test_merge_dotted_id(alsalib, tmp_path, native):
+    (tmp_path / 'ucm.conf').write_text('')
+    d = tmp_path / 'conf.d' / 'x'
+    d.mkdir(parents=True)
+    (d / 'main.conf').write_text(DOTTED)
+    u = Ucm(verify=True, native=native)
+    u.reset()
+    u.filename = str(d / 'main.conf')
+    u.syntax = 4
+    c = u.new_config()
+    c.load(u.filename)
+    u.evaluate_inplace(c)
+    assert c['SectionDevice'].value() == {'Speaker.1': {'Comment': 'a', 'Value': {'x': 1}}}
+    if native:
+        c.close()
@@ -0,0 +1,46 @@
+from ucmlib import AlsaConfigUcm, AlsaConfigUcmNative
+
+TEXT = '''
+Syntax 4
+SectionUseCase."HiFi" { File "HiFi.conf" Comment "x" }
+SectionDevice."Speaker.1" { Value { A 1 B "b" } }
+Arr [ 1 [ 2 3 ] { c 4 } ]
+'''
+
+def load(cls, tmp_path, **kwargs):
+    fn = tmp_path / 'main.conf'
+    fn.write_text(TEXT)
+    c = cls()
+    c.load(str(fn), 'main.conf:', **kwargs)
+    return c
+
+def check(c):
+    nodes = list(c.walk())
+    # the origins like the former AlsaConfigUcm.loaded() computed them
+    origins = [c.prefix + n.full_id() for n in nodes]
+    assert [n.origin_id() for n in nodes] == origins
+
+def check_moves(c):
+    # the origins are requested first after a move and a rename
+    spk = c['SectionDevice'].get_literal('Speaker.1')
+    value = spk['Value']
+    a = value['A']
+    value.remove()
+    c['SectionUseCase']['HiFi'].add(value)
+    a.set_id('Z')
+    spk.set_id('Headphones')
+    prefix = "main.conf:'SectionDevice'."
+    assert spk.origin_id() == prefix + "'Speaker.1'"
+    assert value.origin_id() == prefix + "'Speaker.1'.'Value'"
+    assert a.origin_id() == prefix + "'Speaker.1'.'Value'.'A'"
+    assert c['SectionUseCase']['HiFi']['Value']['Z'] is a
+
+def test_origin(tmp_path):
+    check(load(AlsaConfigUcm, tmp_path, backend='python'))
+    check_moves(load(AlsaConfigUcm, tmp_path, backend='python'))
+
+def test_origin_native(alsalib, tmp_path):
+    with load(AlsaConfigUcmNative, tmp_path) as c:
+        check(c)
+    with load(AlsaConfigUcmNative, tmp_path) as c:
+        check_moves(c)
@@ -8,11 +8,12 @@ import os
 import sys
 sys.path.insert(0, os.path.realpath(os.path.dirname('__file__')) + '/../lib')
 from ucmlib import Ucm, UcmError, ucm_get_configs, ucm_env_get, ucm_env_put
-from alsainfo import AlsaInfo
-from alsajson import AlsaJson
+from aconfig import AlsaConfig, AlsaConfigTree, AlsaConfigError, get_config_cache, get_config_store
+# alsainfo, alsajson, time and resource are imported in the commands using them
 
 LOG_LEVEL=1
 DEBUG=False
+NATIVE=False
 
 # skip this driver
 SKIP_DRIVERS=[
@@ -84,13 +85,13 @@ def env(filename, lvl=0):
 
 def do_one(*args):
     env(args[0], 2)
-    c = Ucm2()
+    c = Ucm2(native=NATIVE)
     c.load(args[0])
 
 def do_all(*args):
 
     def pp(filename):
-        c = Ucm2()
+        c = Ucm2(native=NATIVE)
         c.load(filename)
 
     if len(args) == 0:
@@ -101,7 +102,161 @@ def do_all(*args):
     for c in cs:
         pp(c)
 
+def do_parser(*args):
+
+    def load(filename, backend):
+        c = AlsaConfigTree()
+        try:
+            c.load(filename, backend)
+        except AlsaConfigError as e:
+            return None, str(e)
+        return c.dumps(), None
+
+    if len(args) == 0:
+        error(1, 'Specify root directory with ucm configuration files.')
+
+    env(args[0])
+    errors = 0
+    count = 0
+    for path, dirnames, filenames in os.walk(args[0]):
+        dirnames.sort()
+        for file in sorted(filenames):
+            if file.startswith('.') or not file.endswith('.conf'):
+                continue
+            filename = path + '/' + file
+            count += 1
+            dump1, err1 = load(filename, 'alsalib')
+            dump2, err2 = load(filename, 'python')
+            if dump1 != dump2:
+                errors += 1
+                error1('%s: python parser differs from alsa-lib', filename)
+                if err1 or err2:
+                    error1('  alsa-lib: %s, python: %s', err1, err2)
+                else:
+                    lines1 = dump1.splitlines()
+                    lines2 = dump2.splitlines()
+                    for idx in range(max(len(lines1), len(lines2))):
+                        line1 = idx < len(lines1) and lines1[idx] or None
+                        line2 = idx < len(lines2) and lines2[idx] or None
+                        if line1 != line2:
+                            error1('  alsa-lib: %s', line1)
+                            error1('  python:   %s', line2)
+                            break
+            else:
+                log(2, '%s: ok', filename)
+    log(1, 'checked %s files, %s differences', count, errors)
+    return errors and 1 or 0
+
+def do_bench(*args):
+    import time
+    from alsainfo import AlsaInfo, AlsaInfoError
+
+    def wrappers(t, o):
+        # the conversion used before the bulk export: one AlsaConfig
+        # wrapper and one getter call per node
+        t.id = o.id
+        t.type = o.type
+        if not o.is_compound():
+            t.val = o.value()
+        else:
+            t.val = []
+            t.ids = {}
+            for n in o:
+                ac = AlsaConfigTree(t)
+                t.val.append(ac)
+                t.ids[ac.id] = ac
+                wrappers(ac, n)
+
+    def bench(c, mode, loops):
+        t = time.perf_counter()
+        for i in range(loops):
+            tree = AlsaConfigTree()
+            if mode is None:
+                wrappers(tree, c)
+            else:
+                tree._load(c, bulk=mode)
+        return (time.perf_counter() - t) / loops, sum(1 for n in tree.walk())
+
+    def one(filename):
+        c = AlsaConfig()
+        if filename.endswith('.txt'):
+            info = AlsaInfo()
+            try:
+                info.load(filename)
+            except AlsaInfoError as e:
+                warning(str(e))
+                return
+            if not 'Alsactl' in info.tree:
+                return
+            c.loads(info.tree['Alsactl'].text)
+        else:
+            c.load(filename)
+        wrap, nodes = bench(c, None, loops)
+        walk, nodes = bench(c, False, loops)
+        bulk, nodes = bench(c, True, loops)
+        c.close()
+        log(1, '%s: %s nodes, wrappers %.2fus/node, walk %.2fus/node, bulk %.2fus/node',
+               filename, nodes, wrap * 1e6 / nodes, walk * 1e6 / nodes, bulk * 1e6 / nodes)
+        total[0] += wrap
+        total[1] += walk
+        total[2] += bulk
+        total[3] += nodes
+
+    if len(args) == 0:
+        error(1, 'Specify configuration files or directories (alsa-info .txt or .conf).')
+
+    loops = 10
+    total = [0, 0, 0, 0]
+    for arg in args:
+        if not os.path.isdir(arg):
+            one(arg)
+            continue
+        for path, dirnames, filenames in os.walk(arg):
+            dirnames.sort()
+            for file in sorted(filenames):
+                if file.endswith('.txt') or file.endswith('.conf'):
+                    one(path + '/' + file)
+    if total[3]:
+        log(1, 'total: %s nodes, wrappers %.2fus/node, walk %.2fus/node, bulk %.2fus/node',
+               total[3], total[0] * 1e6 / total[3], total[1] * 1e6 / total[3],
+               total[2] * 1e6 / total[3])
+
+def do_bench_alsactl(*args):
+    import time
+    from alsainfo import AlsaInfo, alsactl_scan
+
+    def bench(fcn, loops):
+        t = time.perf_counter()
+        for i in range(loops):
+            fcn()
+        return (time.perf_counter() - t) / loops
+
+    def full(text):
+        tree = AlsaConfigTree()
+        tree.loads(text)
+        return tree.value()
+
+    if len(args) == 0:
+        error(1, 'Specify alsa-info .txt files.')
+
+    loops = 10
+    for filename in args:
+        info = AlsaInfo()
+        info.load(filename)
+        if not 'Alsactl' in info.tree:
+            continue
+        text = info.tree['Alsactl'].text
+        scan = bench(lambda: alsactl_scan(text), loops)
+        values = bench(lambda: alsactl_scan(text, True), loops)
+        state = bench(lambda: full(text), loops)
+        log(1, '%s: %s bytes, scan %.2fms, scan+values %.2fms, full state %.2fms',
+               filename, len(text), scan * 1e3, values * 1e3, state * 1e3)
+
 def do_configs(*args):
+    import time
+    import resource
+    from alsainfo import AlsaInfo, get_info_store
+    from alsajson import AlsaJson
 
     def import_config(filename):
         fp = open(filename)
@@ -144,7 +299,7 @@ def do_configs(*args):
                 card = info.cards[cardnum]
                 if card.driver in SKIP_DRIVERS:
                     continue
-                c = Ucm2(verify=card)
+                c = Ucm2(verify=card, native=NATIVE)
                 for l in c.get_file_list(ucm_path):
                     if os.path.exists(l):
                         break
@@ -172,9 +327,10 @@ def do_configs(*args):
                     error1('  ' + repr(card))
                     errors += 1
                 if LOG_LEVEL > 255:
-                    sys.stdout.write(c.dump())
+                    c.write(sys.stdout)
         return errors, warnings
 
+    start = time.perf_counter()
     paths = []
     ucm_path = args[0]
     env(ucm_path)
@@ -201,6 +357,11 @@ def do_configs(*args):
                 if not ifstr in configs['suppress_if'] or not configs['suppress_if'][ifstr]:
                     error1('%s block not executed', ifstr)
                     errors += 1
+    log(2, 'config cache: %s', get_config_cache().stats())
+    log(2, 'config store: %s', get_config_store().stats())
+    log(2, 'alsa-info store: %s', get_info_store().stats())
+    log(1, 'configs: %.2fs, peak RSS: %s kB', time.perf_counter() - start,
+           resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
     if warnings > 0:
         warning('total warnings: %s' % warnings)
     if errors > 0:
@@ -215,7 +376,8 @@ def do_unknown(*args):
     error(1, r[:-1])
 
 def main(argv):
-    global DEBUG, LOG_LEVEL
+    global DEBUG, LOG_LEVEL, NATIVE
+    clear = False
     if len(argv) > 1:
         while 1:
             if argv[1] == '--debug':
@@ -227,7 +389,32 @@ def main(argv):
                 argv.pop(0)
                 argv.pop(0)
                 continue
+            elif argv[1] == '--native':
+                NATIVE=True
+                argv.pop(0)
+                continue
+            elif argv[1] == '--cache':
+                from alsainfo import get_info_store
+                get_config_store().path = os.path.join(argv[2], 'aconfig')
+                get_info_store().path = os.path.join(argv[2], 'alsainfo')
+                argv.pop(0)
+                argv.pop(0)
+                continue
+            elif argv[1] == '--no-cache':
+                from alsainfo import get_info_store
+                get_config_store().path = ''
+                get_info_store().path = ''
+                argv.pop(0)
+                continue
+            elif argv[1] == '--clear-cache':
+                clear = True
+                argv.pop(0)
+                continue
             break
+    if clear:
+        from alsainfo import get_info_store
+        get_config_store().clear()
+        get_info_store().clear()
     cmd = 'do_' + (len(argv) > 1 and argv[1] or 'unknown')
     if cmd in globals():
         r = globals()[cmd](*argv[2:])
@@ -8,7 +8,9 @@ import os
 import sys
 import re
 import types
-from aconfig import AlsaConfigTree
+from io import StringIO
+from functools import lru_cache
+from aconfig import AlsaConfig, AlsaConfigTree
 
 VALID_ID_LISTS = {
     'top': {
@@ -134,27 +136,128 @@ def dict_array_append(d, key, val):
         d[key] = []
     d[key].append(val)
 
-class AlsaConfigUcm(AlsaConfigTree):
-    """Class to trace origin"""
+class AlsaConfigOrigin:
+    """Mixin to trace origin
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    The origin string is computed on demand from the file prefix (stored
+    in the top node) and the parent / identifier chain at the load time.
+    The nodes may be moved or renamed by the evaluator, so the load time
+    parent (oparent) and the original identifier (oid, None when unchanged)
+    are kept separately."""
+
+    __slots__ = ()
+
+    def init_origin(self, parent):
         self.origin = None
         self.prefix = None
+        self.oparent = parent
+        self.oid = None
+
+    def set_id(self, id):
+        if self.oid is None:
+            self.oid = self.id
+        super().set_id(id)
+
+    def origin_path(self):
+        """Return (prefix, ids, top_id) of the load time position or None"""
+        ids = []
+        node = self
+        while node.prefix is None:
+            ids.append(node.id if node.oid is None else node.oid)
+            if node.oparent is None:
+                # a moved native node keeps the path instead of the parent
+                opath = getattr(node, 'opath', None)
+                if opath is None:
+                    return None
+                return opath[0], ids + opath[1], opath[2]
+            node = node.oparent
+        return node.prefix, ids, node.id if node.oid is None else node.oid
 
     def origin_id(self):
+        if self.origin is None:
+            r = self.origin_path()
+            if r is None:
+                return None
+            prefix, ids, top_id = r
+            if ids:
+                ids = [repr(ids[0])] + [repr(id) for id in ids[1:] if id]
+                if top_id:
+                    ids.append(repr(top_id))
+                ids.reverse()
+                self.origin = prefix + '.'.join(ids)
+            else:
+                self.origin = prefix + repr(top_id)
         return self.origin
 
-    def _load(self, c):
+class AlsaConfigUcm(AlsaConfigOrigin, AlsaConfigTree):
+    """Python configuration tree with the origin"""
+
+    __slots__ = ('origin', 'prefix', 'oparent', 'oid')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_origin(parent)
+
+    def load(self, filename, origin=None, backend=None):
+        self.prefix = ''
+        if origin:
+            self.prefix = origin
+        super().load(filename, backend)
+
+class AlsaConfigUcmNative(AlsaConfigOrigin, AlsaConfig):
+    """alsa-lib configuration tree with the origin
 
-        def one(n):
-            n.origin = self.prefix + n.full_id()
-            if n.is_compound():
-                for n2 in n:
-                    one(n2)
+    The evaluation runs on the C nodes, the wrappers are created only for
+    the visited nodes and they are cached weakly in the root wrapper, so
+    the wrappers which are not referenced are recreated with the origin
+    computed from the parent chain.
 
-        super()._load(c)
-        one(self)
+    The load time path of a node is saved to opath when it is removed
+    (the load time parent is dropped, it may be in another tree). The
+    moved and the renamed wrappers are kept (pinned) by the root of the
+    tree they belong to, so the origin survives while the node is in
+    that tree."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_origin(parent)
+        self.opath = None
+        self.pinned = None
+
+    def pin(self):
+        """Keep the wrapper in the root of the tree"""
+        root = self.root
+        if root is None:
+            return
+        if root.pinned is None:
+            root.pinned = set()
+        root.pinned.add(self)
+
+    def set_id(self, id):
+        if str(id) != self.id:
+            self.pin()
+        super().set_id(id)
+
+    def remove(self):
+        if self.oparent is None:
+            super().remove()
+            return
+        r = self.origin_path()
+        super().remove()
+        # drop the load time parent (it may be in another tree)
+        self.oparent = None
+        if not r is None:
+            self.opath = (r[0], r[1][1:], r[2])
+        self.pin()
+
+    def _moved(self, old, c):
+        if old.pinned and c in old.pinned:
+            old.pinned.discard(c)
+            c.pin()
+
+    def close(self):
+        super().close()
+        self.pinned = None
 
     def load(self, filename, origin=None):
         self.prefix = ''
@@ -165,6 +268,27 @@ class AlsaConfigUcm(AlsaConfigTree):
 class AlsaControlError(Exception):
     """Indicates exceptions raised by AlsaControl class."""
 
+CONTROL_ID_RE = re.compile(r"(?:([^=]+)='([^']+)'(?:,|$)+)|(?:([^=]+)=\"([^\"]+)\"(?:,|$)+)|(?:([^=]+)=([^=]+)(?:,|$)+)")
+
+@lru_cache(maxsize=1024)
+def control_id_parse(s):
+    """Parse the control identifier string to (iface, name, index) tuple"""
+    r = {'iface': 'MIXER', 'name': None, 'index': 0}
+    for m in CONTROL_ID_RE.findall(s):
+        field = (m[0] or m[2]) or m[4]
+        value = (m[1] or m[3]) or m[5]
+        field = field.strip()
+        value = value.strip()
+        if not field in ('iface', 'name', 'index'):
+            raise AlsaControlError("wrong identifier '%s' (%s)" % (field, s))
+        if field == 'index':
+            try:
+                value = int(value)
+            except ValueError:
+                raise AlsaControlError("wrong index '%s' (%s)" % (value, s))
+        r[field] = value
+    return (r['iface'], r['name'], r['index'])
+
 class AlsaControl:
     """Basic ALSA Control abstraction."""
 
@@ -177,25 +301,15 @@ class AlsaControl:
         self.index = None
         self.type = None
 
+    def key(self):
+        """Return the (iface, name, index) tuple for the lookups"""
+        return (self.iface, self.name, self.index)
+
     def match(self, other):
-        if self.iface == other.iface and \
-           self.name == other.name and \
-           self.index == other.index:
-            return True
-        return False
+        return self.key() == other.key()
 
     def parse(self, s):
-        r1 = r"(?:([^=]+)='([^']+)'(?:,|$)+)|(?:([^=]+)=\"([^\"]+)\"(?:,|$)+)|(?:([^=]+)=([^=]+)(?:,|$)+)"
-        self.iface = 'MIXER'
-        self.index = 0
-        for m in re.findall(r1, s):
-            field = (m[0] or m[2]) or m[4]
-            value = (m[1] or m[3]) or m[5]
-            field = field.strip()
-            value = value.strip()
-            if not field in ('iface', 'name', 'index'):
-                raise AlsaControlError("wrong identifier '%s' (%s)" % (field, s))
-            setattr(self, field, value)
+        self.iface, self.name, self.index = control_id_parse(s)
 
 class UcmError(Exception):
     """Indicates exceptions raised by ucm."""
@@ -398,24 +512,24 @@ class UcmDevice:
         self.check_device_list('ConflictingDevices', self.conflicting)
         self.check_device_list('SupportedDevices', self.supported)
 
-    def dump_device_list(self, what, devices):
-        r = ''
+    def write_device_list(self, fp, indent, what, devices):
         if devices:
             for idx in range(len(devices)):
-                r += '%s.%s = %s' % (what, idx, devices[idx])
-        return r
+                fp.write('%s%s.%s = %s\n' % (indent, what, idx, devices[idx]))
+
+    def write(self, fp, indent=''):
+        """Write the device description to a file-like object"""
+        fp.write('%sDevice: "%s"\n' % (indent, self.name))
+        self.write_device_list(fp, indent + '  ', 'ConflictingDevices', self.conflicting)
+        self.write_device_list(fp, indent + '  ', 'SupportedDevices', self.supported)
+        if self.values:
+            for v in self.values:
+                fp.write('%s  Value.%s = %s\n' % (indent, v, repr(self.values[v])))
 
     def dump(self):
-        r = 'Device: "%s"\n' % self.name
-        v = self.dump_device_list('ConflictingDevices', self.conflicting)
-        if v:
-            r += '\n'.join(map(lambda x: '  ' + x, v.splitlines())) + '\n'
-        v = self.dump_device_list('SupportedDevices', self.supported)
-        if v:
-            r += '\n'.join(map(lambda x: '  ' + x, v.splitlines())) + '\n'
-        for v in self.values:
-            r += '  Value.%s = %s\n' % (v, repr(self.values[v]))
-        return r
+        fp = StringIO()
+        self.write(fp)
+        return fp.getvalue()
 
 class UcmVerb:
 
@@ -515,7 +629,7 @@ class UcmVerb:
         else:
             filename = self.ucm.topdir() + '/' + filename[1:]
         self.ucm.indent_check(filename)
-        aconfig = AlsaConfigUcm()
+        aconfig = self.ucm.new_config()
         self.log(1, "Verb '%s', file '%s'", verbname, self.ucm.shortfn(filename))
         aconfig.load(filename)
         rename_dict = {}
@@ -619,20 +733,27 @@ class UcmVerb:
         self.check_priorities()
         self.check_jackhwmute()
 
-    def dump(self):
-        r = 'Verb: "%s"\n' % self.name
-        r += '  File: %s\n' % self.filename
+    def write(self, fp, indent=''):
+        """Write the verb description to a file-like object"""
+        fp.write('%sVerb: "%s"\n' % (indent, self.name))
+        fp.write('%s  File: %s\n' % (indent, self.filename))
         for device in self.devices:
-            v = self.devices[device].dump()
-            if v:
-                r += '\n'.join(map(lambda x: '  ' + x, v.splitlines())) + '\n'
-        return r
+            self.devices[device].write(fp, indent + '  ')
+
+    def dump(self):
+        fp = StringIO()
+        self.write(fp)
+        return fp.getvalue()
 
 class Ucm:
 
-    def __init__(self, verify=None):
-        """Ucm configuration class."""
+    def __init__(self, verify=None, native=False):
+        """Ucm configuration class.
+
+        The native mode evaluates the configuration directly on
+        the alsa-lib trees (AlsaConfigUcmNative)."""
         self.verify = verify
+        self.native = native
         self.var = {}
 
     def id(self):
@@ -665,6 +786,12 @@ class Ucm:
         self.values = None
         self.filename = ''
 
+    def new_config(self):
+        """Create an empty configuration tree for the evaluation"""
+        if self.native:
+            return AlsaConfigUcmNative()
+        return AlsaConfigUcm()
+
     def cfgdir(self):
         return os.path.split(self.filename)[0]
 
@@ -866,12 +993,10 @@ class Ucm:
         def do_substitute(node):
             if self.syntax < 3:
                 return
-            node.set_id(self.substitute2(self.syntax, node, node.id))
-            if node.is_string():
-                node.val = self.substitute2(self.syntax, node, node.val)
-            elif node.is_compound():
-                for node2 in node:
-                    do_substitute(node2)
+            for node in node.walk():
+                node.set_id(self.substitute2(self.syntax, node, node.id))
+                if node.is_string():
+                    node.set_value(self.substitute2(self.syntax, node, node.value()))
 
         if not src.is_compound():
             self.error(nodes, "merge block is not a compound")
@@ -882,7 +1007,7 @@ class Ucm:
                 dst.add(snode)
                 continue
             else:
-                dnode = dst.search(snode.id)
+                dnode = dst.get_literal(snode.id)
                 if dnode is None:
                     snode.remove()
                     dst.add(snode)
@@ -925,7 +1050,7 @@ class Ucm:
                 else:
                     unique_id(dnode, ctx)
                     if ctx in dnode:
-                        snode2 = AlsaConfigUcm(snode)
+                        snode2 = self.new_config()
                         snode2.set_id('__merge__')
                         snode2.make_compound()
                         snode2.add(ctx)
@@ -1060,7 +1185,7 @@ class Ucm:
                     before_node = node2
                 elif id == 'After':
                     after_node = node2
-            origin_text = node.origin
+            origin_text = node.origin_id()
             node.remove()
             if ctx_node is None:
                 self.error(inc_node, 'File string is not defined')
@@ -1071,7 +1196,7 @@ class Ucm:
                 filename = self.topdir() + '/' + filename[1:]
             if not self.verify and self.invalid_filename(filename):
                 continue
-            nodes = AlsaConfigUcm()
+            nodes = self.new_config()
             self.log(2, "Include %s, file '%s'", node.full_id(), self.shortfn(filename))
             nodes.load(filename, origin_text + '.')
             self.evaluate_inplace(nodes, origin)
@@ -1203,7 +1328,7 @@ class Ucm:
         filename = os.path.abspath(filename)
         self.filename = filename
         self.indent_check(filename)
-        aconfig = AlsaConfigUcm()
+        aconfig = self.new_config()
         self.log(1, "Device file '%s'", self.shortfn())
         aconfig.load(filename)
         if 'Syntax' in aconfig:
@@ -1230,13 +1355,16 @@ class Ucm:
         for verb in self.verbs:
             verb.check()
 
-    def dump(self):
-        r = 'File: %s\n' % self.filename
+    def write(self, fp, indent=''):
+        """Write the configuration description to a file-like object"""
+        fp.write('%sFile: %s\n' % (indent, self.filename))
         for verb in self.verbs:
-            v = verb.dump()
-            if v:
-                r += '\n'.join(map(lambda x: '  ' + x, v.splitlines())) + '\n'
-        return r
+            verb.write(fp, indent + '  ')
+
+    def dump(self):
+        fp = StringIO()
+        self.write(fp)
+        return fp.getvalue()
 
     def get_file_list1(self, path):
         card = self.verify
@@ -1253,7 +1381,7 @@ class Ucm:
         fn = os.path.abspath(os.path.realpath(path + '/ucm.conf'))
         if not os.path.exists(fn):
             return self.get_file_list1(path)
-        c = AlsaConfigUcm()
+        c = self.new_config()
         self.filename = fn
         self.cfgdir = types.MethodType(list_topdir, self)
         self.topdir = types.MethodType(list_topdir, self)
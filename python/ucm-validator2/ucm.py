@@ -7,7 +7,6 @@
 import os
 import sys
 import re
-import inspect
 import argparse
 sys.path.insert(0, f'{os.path.realpath(os.path.dirname("__file__"))}/../lib')
 from aconfig import AlsaConfig
@@ -110,29 +109,29 @@ class BasicVerification:
                 self.state.error(self.filename, f'Device name {node.id} /{node.full_id()}/ is not valid (see https://github.com/alsa-project/alsa-lib/blob/master/include/use-case.h)')
 
         def walk(node):
-            if node.id == 'SectionDevice':
-                if not node.is_compound():
-                    if node.parent.id in ('Before', 'After'):
-                        return
-                    self.state.error(self.filename, f'SectionDevice {node.full_id()} should be compound! ({node.value()})')
-                for c in node:
-                    SectionDeviceVerify(c)
-                return
-            if node.is_compound():
-                for c in node:
-                    walk(c)
-
-        try:
-            ac = AlsaConfig()
-            ac.load(self.filename)
-        except BaseException as exc:
-            self.state.exc_error(self.filename, "ALSA configuration load error", exc)
-            return
+            for c in node.walk(prune=lambda n: n.id == 'SectionDevice'):
+                if c.id != 'SectionDevice':
+                    continue
+                if not c.is_compound():
+                    if c.parent.id in ('Before', 'After'):
+                        continue
+                    self.state.error(self.filename, f'SectionDevice {c.full_id()} should be compound! ({c.value()})')
+                for d in c:
+                    SectionDeviceVerify(d)
+
+        ac = AlsaConfig()
         try:
+            try:
+                ac.load(self.filename)
+            except BaseException as exc:
+                self.state.exc_error(self.filename, "ALSA configuration load error", exc)
+                return
             walk(ac)
         except BaseException as exc:
             self.state.exc_error(self.filename, "UCM error", exc)
             return
+        finally:
+            ac.close()
 
     def indentation_check(self):
         lineno = 1
@@ -184,10 +183,9 @@ class CommandConfigs(BaseCommand):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='UCM configuration validator')
     subparser = parser.add_subparsers(title='Commands', dest='command')
-    class_list = inspect.getmembers(sys.modules[__name__], inspect.isclass)
     class_dict = {}
-    for name, obj in class_list:
-        if name.startswith('Command') and issubclass(obj, BaseCommand):
+    for name, obj in sorted(globals().items()):
+        if name.startswith('Command') and isinstance(obj, type) and issubclass(obj, BaseCommand):
             n = name[7:].lower()
             class_dict[n] = o = obj(n)
             o.arguments(subparser)